@@ -0,0 +1,105 @@
+import queue
+import threading
+import tkinter.filedialog as tk
+
+
+class JobCancelled(Exception):
+    # Исключение, которым прерывается отмененная задача в ближайшей точке проверки.
+    pass
+
+
+class BackgroundJob:
+    # Выполнение долгого расчета в отдельном потоке. Поток не обращается к виджетам: сообщения о ходе работы и
+    # результат передаются через очередь, а окно забирает их методом after(), поэтому интерфейс не зависает.
+    poll_interval = 100
+    # Период опроса очереди в мс.
+
+    def __init__(self, widget, function, on_done, on_error, on_progress):
+        self.widget = widget
+        self.function = function
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.is_finished = False
+
+    def start(self):
+        self.thread.start()
+        self.widget.after(self.poll_interval, self.poll)
+
+    def run(self):
+        # Выполняется в рабочем потоке. Функция получает задачу, чтобы сообщать о ходе работы и проверять отмену.
+        try:
+            result = self.function(self)
+            self.queue.put(('done', result))
+        except JobCancelled:
+            self.queue.put(('cancelled', None))
+        except Exception as error:
+            self.queue.put(('error', error))
+
+    def report_progress(self, text):
+        # Точка проверки: если задача отменена, расчет прерывается здесь.
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        self.queue.put(('progress', text))
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def poll(self):
+        # Выполняется в главном потоке окна.
+        while True:
+            try:
+                kind, value = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                self.on_progress(value)
+            else:
+                self.is_finished = True
+                if kind == 'done':
+                    self.on_progress('Done')
+                    self.on_done(value)
+                elif kind == 'error':
+                    self.on_progress('Error')
+                    self.on_error(value)
+                else:
+                    self.on_progress('Cancelled')
+                return
+        self.widget.after(self.poll_interval, self.poll)
+
+
+class JobControls(tk.Frame):
+    # Рамка со строкой состояния и кнопкой отмены, общая для всех окон программы. Одновременно в окне выполняется
+    # только одна задача.
+    def __init__(self, master):
+        super().__init__(master)
+        self.status_label = tk.Label(self, text='', anchor='w')
+        self.status_label.pack(side='top', fill='x')
+        self.cancel_button = tk.Button(self, text='Cancel', command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.pack(side='top', fill='x')
+        self.job = None
+
+    def is_running(self):
+        return self.job is not None and not self.job.is_finished
+
+    def start(self, function, on_done, on_error):
+        # Запуск функции function(job) в рабочем потоке. on_done и on_error вызываются в главном потоке.
+        if self.is_running():
+            return
+        self.cancel_button.config(state=tk.NORMAL)
+        self.job = BackgroundJob(self, function, on_done, on_error, self.show_progress)
+        self.show_progress('Running...')
+        self.job.start()
+
+    def show_progress(self, text):
+        self.status_label['text'] = text
+        if self.job is not None and self.job.is_finished:
+            self.cancel_button.config(state=tk.DISABLED)
+
+    def cancel(self):
+        if self.is_running():
+            self.job.cancel()
+            self.show_progress('Cancelling...')
@@ -0,0 +1,304 @@
+import argparse
+import concurrent.futures
+import os
+import sys
+from enum import Enum
+import one_file_not_console
+import two_file_not_console
+import new_statistics_methods
+from instrumentation import Trace
+from result_cache import ResultCache
+from plate_layout import PlateRegion
+from sample_table import TableFile
+from standard_curve import Quantification, QuantificationMode
+
+
+class ManifestEntry:
+    # Одна строка манифеста: файл с прибора, диапазон строк, количество пробы, файл референсного гена, файл групп и
+    # необязательная область планшетов, которая заменяет диапазон строк.
+    def __init__(self, file, first_raw, last_raw, quantity, reference, group, region=''):
+        self.file = file
+        self.first_raw = first_raw
+        self.last_raw = last_raw
+        self.quantity = quantity
+        self.reference = reference
+        self.group = group
+        self.region = region
+
+    def __repr__(self):
+        return self.file + '\t' + str(self.first_raw) + '\t' + str(self.last_raw) + '\t' + str(self.quantity) + '\t' +\
+               self.reference + '\t' + self.group + ('\t' + self.region if self.region != '' else '')
+
+    def name(self):
+        # Название прогона без расширения, используется в названиях выходных файлов.
+        return os.path.splitext(os.path.basename(self.file))[0]
+
+
+class Manifest(list):
+    # Список прогонов для пакетной обработки. Файл манифеста разделен точкой с запятой, как файл с названиями групп:
+    # file;first raw;last raw;quantity;reference;group[;region]
+    # Для референсного гена поля reference и group остаются пустыми. Если указана область планшетов (B1-H12,
+    # 1-10:A1-P24), то диапазон строк можно оставить пустым.
+    def __init__(self, file_name: str):
+        super().__init__()
+        file_text = Manifest.load_file(file_name)
+        for element in Manifest.parse_file_text(file_text):
+            self.append(element)
+
+    @staticmethod
+    def parse_file_text(file_text):
+        for line in file_text[1:]:
+            if line.strip() == '':
+                continue
+            parts = [part.strip() for part in str.split(line, ';')]
+            parts += [''] * (7 - len(parts))
+            yield ManifestEntry(parts[0], int(parts[1]) if parts[1] != '' else -1,
+                                int(parts[2]) if parts[2] != '' else -1, float(parts[3]), parts[4], parts[5], parts[6])
+
+    @staticmethod
+    def load_file(file_name):
+        # Открытие файла и создание списка из строк.
+        file = open(file_name)
+        lines = file.readlines()
+        file.close()
+        return lines
+
+    def find(self, file):
+        # Поиск строки манифеста по имени файла с прибора.
+        for entry in self:
+            if entry.file == file:
+                return entry
+        raise ValueError('File ' + file + ' is not listed in manifest')
+
+
+class BatchStage(Enum):
+    # Этапы пакетной обработки, задачи одного этапа не зависят друг от друга.
+    raw_data = 'Processing raw data'
+    gene = 'Statistic processing'
+    panel = 'Gene panel'
+
+
+class JobResult:
+    # Результат одной задачи пакетной обработки. Ошибка в задаче не останавливает остальные задачи.
+    def __init__(self, stage, file, messages, error):
+        self.stage = stage
+        self.file = file
+        self.messages = messages
+        self.error = error
+
+    def __repr__(self):
+        lines = [self.stage.value + ': ' + self.file + (' - error: ' + self.error if self.error is not None else '')]
+        lines += self.messages
+        return '\n'.join(lines)
+
+
+class BatchProcessing:
+    # Последовательный запуск всех трех разделов программы для каждого прогона из манифеста без графического
+    # интерфейса.
+    def __init__(self, run_directory, manifest_name, output_directory, workers=None, panel=False, binary=False,
+                 cache: ResultCache = None, trace=None, trace_memory=False, quantification: Quantification = None):
+        self.run_directory = run_directory
+        self.panel = panel
+        # Гены с общим референсным геном и файлом групп обрабатываются одной панелью с общим отчетом.
+        self.binary = binary
+        # Разделы дополнительно записывают двоичные таблицы .npz и передают результат следующему разделу через них,
+        # текстовые файлы также записываются.
+        self.workers = workers or os.cpu_count() or 1
+        # Количество процессов, в которых одновременно обрабатываются прогоны.
+        self.output_directory = output_directory
+        self.cache = cache
+        # Кэш результатов: при повторном запуске неизмененные прогоны не разбираются и не считаются заново.
+        self.manifest = Manifest(os.path.join(run_directory, manifest_name))
+        self.quantification = quantification
+        # Способ расчета концентраций в разделе Processing raw data, по умолчанию концентрации прибора.
+        self.trace = trace
+        self.trace_memory = trace_memory
+        # Файл трассы этапов обработки. Каждый процесс дописывает в него свои события после каждой задачи.
+
+    def ordered_results_path(self, entry: ManifestEntry, extension='.txt'):
+        return os.path.join(self.output_directory, 'ordered_results_' + entry.name() + extension)
+
+    def full_list_path(self, entry: ManifestEntry, extension='.txt'):
+        return os.path.join(self.output_directory, 'proANOVA_' + entry.name() + extension)
+
+    def interchange_extension(self):
+        # Расширение файлов, через которые разделы передают результат друг другу.
+        return TableFile.extension if self.binary else '.txt'
+
+    def anova_result_path(self, entry: ManifestEntry):
+        return os.path.join(self.output_directory, 'ANOVA_result_' + entry.name() + '.txt')
+
+    def panel_result_path(self, entries: list):
+        return os.path.join(self.output_directory, 'ANOVA_panel_' + self.manifest.find(entries[0].reference).name() +
+                            '_' + os.path.splitext(os.path.basename(entries[0].group))[0] + '.txt')
+
+    def process_raw_data(self, entry: ManifestEntry):
+        # Раздел Processing raw data.
+        region = PlateRegion.parse(entry.region) if entry.region != '' else None
+        if entry.quantity <= 0 or region is None and (entry.first_raw < 0 or entry.last_raw <= entry.first_raw):
+            raise ValueError('Wrong row range in manifest for ' + entry.file)
+        # Количество строк не ограничено одним планшетом на 96 лунок.
+        logic = one_file_not_console.LogicLayer(self.cache)
+        logic.load_work_file(os.path.join(self.run_directory, entry.file))
+        logic.resume_processing(entry.first_raw, entry.last_raw, entry.quantity, quantification=self.quantification,
+                                region=region)
+        logic.write_results(self.ordered_results_path(entry))
+        if self.binary:
+            logic.write_results(self.ordered_results_path(entry, TableFile.extension))
+        if logic.curve is not None:
+            return [str(logic.curve)]
+        return []
+
+    def create_full_list(self, entry: ManifestEntry):
+        # Раздел Create full list.
+        logic = two_file_not_console.LogicLayer(self.cache)
+        extension = self.interchange_extension()
+        logic.gene_file_name = self.ordered_results_path(entry, extension)
+        logic.comparative_file_name = self.ordered_results_path(self.manifest.find(entry.reference), extension)
+        logic.group_file_name = os.path.join(self.run_directory, entry.group)
+        logic.resume_processing()
+        logic.write_results(self.full_list_path(entry))
+        if self.binary:
+            logic.write_results(self.full_list_path(entry, TableFile.extension))
+        if not logic.tempsamples.report.is_empty():
+            return [str(logic.tempsamples.report)]
+        return []
+
+    def process_statistics(self, entry: ManifestEntry):
+        # Раздел Statistic processing, в обработку берутся все пробы.
+        logic = new_statistics_methods.LogicLayer(self.cache)
+        sample_list = logic.load_work_file(self.full_list_path(entry, self.interchange_extension()))
+        logic.write_results(sample_list, self.anova_result_path(entry), cache=self.cache)
+
+    def process_gene(self, entry: ManifestEntry):
+        # Разделы Create full list и Statistic processing для одного целевого гена.
+        messages = self.create_full_list(entry)
+        self.process_statistics(entry)
+        return messages
+
+    def process_panel(self, entries: list):
+        # Разделы Create full list и Statistic processing для всех генов панели: файл групп и референсный ген
+        # читаются один раз, результат записывается в один отчет.
+        sample_average = two_file_not_console.ParsingType.sample_average
+        extension = self.interchange_extension()
+        gene_lists = {}
+        for entry in entries:
+            gene_lists[entry.name()] = two_file_not_console.GeneSampleList(self.ordered_results_path(entry, extension),
+                                                                           sample_average)
+        comparative = two_file_not_console.ComparativeSampleList(
+            self.ordered_results_path(self.manifest.find(entries[0].reference), extension), sample_average)
+        group = two_file_not_console.GroupNameList(os.path.join(self.run_directory, entries[0].group),
+                                                   two_file_not_console.ParsingType.group_name)
+        panel = two_file_not_console.GenePanel(gene_lists, comparative, group)
+        file = open(self.panel_result_path(entries), 'w')
+        for item in new_statistics_methods.LogicLayer.resume_panel_processing(panel):
+            file.write(str(item) + '\n')
+        file.close()
+        if not panel.report.is_empty():
+            return [str(panel.report)]
+        return []
+
+    def run_job(self, stage, job):
+        # Выполнение одной задачи в отдельном процессе. Любая ошибка записывается в результат задачи. Задача панели
+        # генов получает список строк манифеста, остальные задачи - одну строку.
+        name = ', '.join(entry.file for entry in job) if stage == BatchStage.panel else job.file
+        if self.trace is not None:
+            Trace.enable(self.trace, self.trace_memory)
+        try:
+            with Trace.span('batch: ' + stage.value, file=name):
+                if stage == BatchStage.raw_data:
+                    messages = self.process_raw_data(job)
+                elif stage == BatchStage.panel:
+                    messages = self.process_panel(job)
+                else:
+                    messages = self.process_gene(job)
+            return JobResult(stage, name, messages, None)
+        except Exception as error:
+            return JobResult(stage, name, [], type(error).__name__ + ': ' + str(error))
+        finally:
+            Trace.flush()
+            # Процессы пакетной обработки завершаются без atexit, поэтому события записываются после каждой задачи.
+
+    def run_jobs(self, stage, jobs):
+        # Задачи одного раздела независимы друг от друга и распределяются по процессам. Результаты возвращаются в
+        # порядке строк манифеста, а не в порядке завершения.
+        if self.workers == 1:
+            return [self.run_job(stage, job) for job in jobs]
+        Trace.flush()
+        # События главного процесса записываются до запуска процессов, иначе процессы унаследуют их копию.
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.run_job, stage, job) for job in jobs]
+            return [future.result() for future in futures]
+
+    def run(self):
+        os.makedirs(self.output_directory, exist_ok=True)
+        results = self.run_jobs(BatchStage.raw_data, self.manifest)
+        failed_files = [result.file for result in results if result.error is not None]
+        gene_entries = [entry for entry in self.manifest if entry.reference != '' and entry.file not in failed_files
+                        and entry.reference not in failed_files]
+        if self.panel:
+            panels = {}
+            for entry in gene_entries:
+                panels.setdefault((entry.reference, entry.group), []).append(entry)
+            results += self.run_jobs(BatchStage.panel, list(panels.values()))
+        else:
+            results += self.run_jobs(BatchStage.gene, gene_entries)
+        for entry in self.manifest:
+            if entry.reference != '' and entry not in gene_entries:
+                results.append(JobResult(BatchStage.gene, entry.file, [], 'raw data processing failed'))
+                # Если не удалось обработать файл гена или референсного гена, то статистика для него не считается.
+        for result in results:
+            print(result)
+        return results
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='PCR processing without graphical interface')
+    parser.add_argument('run_directory', help='directory with raw LightCycler 480 exports and group files')
+    parser.add_argument('--manifest', default='manifest.txt', help='manifest file name inside run directory')
+    parser.add_argument('--output', default=None, help='directory for results, run_directory/results by default')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes, all cores by default')
+    parser.add_argument('--panel', action='store_true',
+                        help='process genes with the same reference gene and group file as one panel report')
+    parser.add_argument('--binary', action='store_true',
+                        help='also write .npz tables and pass unrounded values between stages through them')
+    parser.add_argument('--cache', default=None, help='result cache directory, ' + ResultCache.default_directory() +
+                        ' by default')
+    parser.add_argument('--cache-size', type=int, default=None, help='maximum cache size in megabytes')
+    parser.add_argument('--no-cache', action='store_true', help='process all runs without the result cache')
+    parser.add_argument('--clear-cache', action='store_true', help='remove all cached results before processing')
+    parser.add_argument('--quantification', default=QuantificationMode.instrument.name,
+                        choices=[item.name for item in QuantificationMode],
+                        help='concentrations from the instrument (default), a standard curve fitted to the standard '
+                             'wells of each run, or ddCt relative quantities')
+    parser.add_argument('--calibrator', default=None, help='calibrator sample for ddCt, the mean of all samples by '
+                        'default')
+    parser.add_argument('--efficiency', type=float, default=None,
+                        help='amplification efficiency for ddCt (1.0 is 100%%), from the standard curve by default')
+    parser.add_argument('--trace', default=None,
+                        help='append stage timings to this file (Chrome trace, or JSON lines for .jsonl)')
+    parser.add_argument('--trace-memory', action='store_true', help='also record peak memory of each traced stage')
+    arguments = parser.parse_args(arguments)
+    output_directory = arguments.output or os.path.join(arguments.run_directory, 'results')
+    cache_size = arguments.cache_size * 1024 * 1024 if arguments.cache_size is not None else None
+    cache = ResultCache(arguments.cache, cache_size)
+    if arguments.clear_cache:
+        cache.clear()
+    if arguments.no_cache:
+        cache = None
+    try:
+        results = BatchProcessing(arguments.run_directory, arguments.manifest, output_directory,
+                                  arguments.workers, arguments.panel, arguments.binary, cache, arguments.trace,
+                                  arguments.trace_memory,
+                                  Quantification(QuantificationMode[arguments.quantification], arguments.calibrator,
+                                                 arguments.efficiency)).run()
+    except (OSError, ValueError, IndexError) as error:
+        print('Error: ' + str(error), file=sys.stderr)
+        return 1
+    if any(result.error is not None for result in results):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+import argparse
+import datetime
+import itertools
+import json
+import numpy
+import os
+import platform
+import random
+import scipy
+import subprocess
+import sys
+import tempfile
+import time
+import one_file_not_console
+import two_file_not_console
+import new_statistics_methods
+from factorial_anova import SumOfSquaresType
+from pairwise_comparisons import ComparisonType
+from sample_table import SampleTable
+from standard_curve import Quantification, QuantificationMode
+from synthetic_runs import SyntheticRun
+
+
+def make_samples(number_of_wells):
+    # Создание таблицы проб со случайными концентрациями, повторы одной пробы стоят рядом, как после сортировки.
+    generator = random.Random(38)
+    numbers = []
+    concs = []
+    for i in range(number_of_wells):
+        concs.append('{:.2E}'.format(generator.uniform(0.001, 100)) if generator.random() > 0.02 else '0')
+        numbers.append(str(i // 2 + 1) + 'ab'[i % 2])
+    return SampleTable(numbers, numpy.asarray(concs, dtype=float))
+
+
+def measure(function, repeat=3, setup=None):
+    # Лучшее время из нескольких запусков. Если задана функция setup, то ее результат передается в function, время
+    # подготовки не учитывается.
+    best = None
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        start_time = time.perf_counter()
+        function(argument) if setup is not None else function()
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def replicate_aggregation(sizes=(96, 960, 9600, 96000)):
+    # Время усреднения повторов в зависимости от количества лунок. При линейной сложности время на одну лунку
+    # остается примерно постоянным.
+    print('wells\tseconds\tus per well')
+    for size in sizes:
+        samples = make_samples(size)
+        elapsed = measure(lambda: one_file_not_console.ListOfStatisticsSamples(samples, 2))
+        print(str(size) + '\t' + str(round(elapsed, 4)) + '\t' + str(round(elapsed / size * 1e6, 2)))
+
+
+STARTUP_CODE = '''
+import time
+start_time = time.perf_counter()
+import tkinter
+def first_paint(root):
+    root.update()
+    print('first paint', time.perf_counter() - start_time)
+    root.destroy()
+tkinter.Tk.mainloop = first_paint
+import entry_to_programm
+'''
+# Запуск главного меню: вместо цикла обработки событий окно один раз отрисовывается и закрывается.
+
+HEAVY_MODULES = ('numpy', 'scipy')
+# Модули, которые не должны загружаться до открытия раздела программы.
+
+
+def parse_import_time(stderr_text):
+    # Суммарное время импорта (мкс) для каждого модуля верхнего уровня из вывода python -X importtime и названия
+    # всех импортированных модулей, включая вложенные импорты.
+    cumulative = {}
+    imported = set()
+    for line in stderr_text.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        name = parts[2].rstrip()[1:]
+        imported.add(name.strip())
+        if name == name.lstrip():
+            cumulative[name] = int(parts[1])
+    return cumulative, imported
+
+
+def startup(target=0.5):
+    # Время до первой отрисовки главного меню в отдельном процессе и проверка, что numpy и scipy не импортируются.
+    # Возвращает True, если запуск укладывается в target секунд.
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_CODE], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    if process.returncode != 0:
+        print(process.stderr.splitlines()[-1] if process.stderr else 'startup failed')
+        return False
+    cumulative, imported = parse_import_time(process.stderr)
+    heavy = [name for name in HEAVY_MODULES if name in imported]
+    paint_time = float(process.stdout.split()[-1])
+    print('module\tseconds')
+    for name, microseconds in sorted(cumulative.items(), key=lambda item: -item[1])[:10]:
+        print(name + '\t' + str(round(microseconds / 1e6, 4)))
+    print('imports total\t' + str(round(sum(cumulative.values()) / 1e6, 4)))
+    print('first paint\t' + str(round(paint_time, 4)) + '\ttarget\t' + str(target))
+    if heavy:
+        print('loaded at startup: ' + ', '.join(heavy))
+    return paint_time < target and not heavy
+
+
+STAGES = ('parsing', 'standard curve', 'ordering', 'replicate aggregation', 'joining', 'grouping', 'anova', 'pairwise')
+# Этапы обработки, время которых измеряется отдельно.
+
+
+def time_stages(run: SyntheticRun, paths: dict, directory, repeat=3):
+    # Время каждого этапа обработки искусственного прогона. Результат этапа, нужный следующему этапу, готовится один
+    # раз вне измерения, промежуточные файлы записываются в directory.
+    timings = {}
+    first_raw, last_raw = run.first_raw(), run.last_raw()
+    timings['parsing'] = measure(lambda: one_file_not_console.SampleList(paths['target']), repeat)
+    timings['standard curve'] = measure(
+        lambda samples: samples.quantify(Quantification(QuantificationMode.standard_curve)), repeat,
+        lambda: one_file_not_console.SampleList(paths['target']))
+    parsed_samples = one_file_not_console.SampleList(paths['target'])
+    timings['ordering'] = measure(lambda: parsed_samples.resume_processing(first_raw, last_raw), repeat)
+    # Упорядочение не меняет разобранную таблицу, поэтому файл разбирается один раз.
+    ordered_paths = {}
+    for kind in ('target', 'reference'):
+        logic = one_file_not_console.LogicLayer()
+        logic.file_name = paths[kind]
+        logic.samples = one_file_not_console.SampleList(paths[kind])
+        logic.first_raw, logic.last_raw, logic.quantity = first_raw, last_raw, 2
+        logic.quantification = Quantification()
+        logic.region = None
+        logic.tempsamples = logic.process_samples()
+        ordered_paths[kind] = os.path.join(directory, 'ordered_results_' + kind + '.txt')
+        logic.write_results(ordered_paths[kind])
+        if kind == 'target':
+            ordered_samples = logic.samples.resume_processing(first_raw, last_raw)
+            timings['replicate aggregation'] = measure(
+                lambda: one_file_not_console.ListOfStatisticsSamples(ordered_samples, 2), repeat)
+
+    gene = two_file_not_console.GeneSampleList(ordered_paths['target'], two_file_not_console.ParsingType.sample_average)
+    comparative = two_file_not_console.ComparativeSampleList(ordered_paths['reference'],
+                                                             two_file_not_console.ParsingType.sample_average)
+    group = two_file_not_console.GroupNameList(paths['group'], two_file_not_console.ParsingType.group_name)
+    timings['joining'] = measure(lambda: two_file_not_console.ListSampleForProcessing(gene, comparative, group), repeat)
+    logic = two_file_not_console.LogicLayer()
+    logic.tempsamples = two_file_not_console.ListSampleForProcessing(gene, comparative, group)
+    full_list_path = os.path.join(directory, 'proANOVA.txt')
+    logic.write_results(full_list_path)
+
+    samples = list(new_statistics_methods.SampleList(full_list_path))
+    group_type = new_statistics_methods.GroupType.Normal
+    timings['grouping'] = measure(lambda: new_statistics_methods.GroupStatistics(samples, group_type), repeat)
+    groups = new_statistics_methods.GroupStatistics(samples, group_type)
+    if int(numpy.sum(groups.counts)) == 0:
+        # Без сгруппированных проб время анализа ничего не показывает, поэтому прогон считается ошибкой.
+        report = logic.tempsamples.report
+        raise ValueError('No grouped samples in ' + full_list_path + ' for ' + str(run.plates) + ' plates' +
+                         ('' if report.is_empty() else ': ' + repr(report).splitlines()[0]))
+    timings['anova'] = measure(lambda: new_statistics_methods.GroupStatistics.find_influence_of_factors(
+        groups.index, SumOfSquaresType.type_3), repeat)
+    timings['pairwise'] = measure(lambda: groups.find_pairwise_comparisons(ComparisonType.fisher), repeat)
+    return timings, len(samples), len(groups)
+
+
+def git_commit():
+    # Текущий коммит, если программа запущена из репозитория.
+    try:
+        process = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return process.stdout.strip() if process.returncode == 0 else None
+
+
+def suite(plates=(1, 10, 100), wells=(96, 384), factors=(2, 3), output='benchmark_results.json', repeat=3):
+    # Время этапов обработки на искусственных прогонах всех сочетаний размеров. Результаты запуска дописываются в
+    # JSON-файл output вместе с версиями программы и библиотек, чтобы по истории запусков было видно ухудшения.
+    record = {'created': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+              'python': platform.python_version(), 'numpy': numpy.__version__, 'scipy': scipy.__version__,
+              'machine': platform.platform(), 'repeat': repeat, 'results': []}
+    print('plates\twells\tfactors\tsamples\tgroups\t' + '\t'.join(STAGES))
+    with tempfile.TemporaryDirectory() as directory:
+        for plate_count, well_count, factor_count in itertools.product(plates, wells, factors):
+            run = SyntheticRun(plate_count, well_count, factor_count)
+            run_directory = os.path.join(directory, '_'.join(str(size) for size in (plate_count, well_count,
+                                                                                    factor_count)))
+            timings, samples, groups = time_stages(run, run.write(run_directory), run_directory, repeat)
+            record['results'].append({'plates': plate_count, 'wells': well_count, 'factors': factor_count,
+                                      'samples': samples, 'groups': groups, 'seconds': timings})
+            print('\t'.join(str(value) for value in (plate_count, well_count, factor_count, samples, groups)) + '\t' +
+                  '\t'.join(str(round(timings[stage], 4)) for stage in STAGES))
+    history = []
+    if os.path.exists(output):
+        with open(output) as file:
+            history = json.load(file)
+    history.append(record)
+    with open(output, 'w') as file:
+        json.dump(history, file, indent=1)
+    return record
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the PCR processing stages.')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('replicates', help='replicate aggregation time by number of wells (default)')
+    commands.add_parser('startup', help='main menu startup time and heavy imports')
+    suite_parser = commands.add_parser('suite', help='time every stage on synthetic runs and record them to JSON')
+    suite_parser.add_argument('--plates', type=int, nargs='+', default=[1, 10, 100])
+    suite_parser.add_argument('--wells', type=int, nargs='+', default=[96, 384], choices=[96, 384])
+    suite_parser.add_argument('--factors', type=int, nargs='+', default=[2, 3])
+    suite_parser.add_argument('--repeat', type=int, default=3, help='runs of each stage, the best time is kept')
+    suite_parser.add_argument('--output', default='benchmark_results.json',
+                              help='JSON file the results are appended to (default benchmark_results.json)')
+    arguments = parser.parse_args(arguments)
+    if arguments.command == 'startup':
+        return 0 if startup() else 1
+    if arguments.command == 'suite':
+        try:
+            suite(arguments.plates, arguments.wells, arguments.factors, arguments.output, arguments.repeat)
+        except ValueError as error:
+            print('benchmark failed: ' + str(error))
+            return 1
+        return 0
+    replicate_aggregation()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
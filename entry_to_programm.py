@@ -1,7 +1,6 @@
 import tkinter.filedialog as tk
-import one_file_not_console
-import two_file_not_console
-import new_statistics_methods
+import functools
+import importlib
 import os
 
 
@@ -13,15 +12,21 @@ class Interfacing:
         # Создание основного окна.
         root.minsize(600, 400)
 
-        self.one_file_not_console_button = tk.Button(root, text='Processing raw data', command=one_file_not_console.start)
+        self.one_file_not_console_button = tk.Button(root, text='Processing raw data',
+                                                     command=functools.partial(self.open_stage, 'one_file_not_console'))
         self.one_file_not_console_button.pack(side='top', fill='x', padx=20, pady=5)
 
-        self.two_file_not_console_button = tk.Button(root, text='Create full list', command=two_file_not_console.start)
+        self.two_file_not_console_button = tk.Button(root, text='Create full list',
+                                                     command=functools.partial(self.open_stage, 'two_file_not_console'))
         self.two_file_not_console_button.pack(side='top', fill='x',  padx=20, pady=5)
 
-        self.new_statistics_methods_button = tk.Button(root, text='Statistic processing', command=new_statistics_methods.start)
+        self.new_statistics_methods_button = tk.Button(root, text='Statistic processing',
+                                                       command=functools.partial(self.open_stage, 'new_statistics_methods'))
         self.new_statistics_methods_button.pack(side='top', fill='x',  padx=20, pady=5)
 
+        self.clear_cache_button = tk.Button(root, text='Clear cache', command=self.clear_cache)
+        self.clear_cache_button.pack(side='top', fill='x', padx=20, pady=5)
+
         self.help_button = tk.Button(root, text='Help', command=self.help)
         self.help_button.pack(side='top', fill='x',  padx=20, pady=5)
 
@@ -33,6 +38,17 @@ class Interfacing:
 
         root.mainloop()
 
+    @staticmethod
+    def clear_cache():
+        # Удаление всех сохраненных результатов обработки. Модуль кэша тоже импортируется только по нажатию кнопки.
+        importlib.import_module('result_cache').ResultCache().clear()
+
+    @staticmethod
+    def open_stage(module_name):
+        # Модуль раздела импортируется только при первом открытии раздела, вместе с ним загружаются numpy и scipy.
+        # Так главное меню открывается быстро.
+        importlib.import_module(module_name).start()
+
     @staticmethod
     def help():
         os.system('readme.txt')
@@ -0,0 +1,135 @@
+import itertools
+import numpy
+import scipy.stats
+from enum import Enum
+
+
+class SumOfSquaresType(Enum):
+    # Способ расчета сумм квадратов эффектов для несбалансированных планов. В Statistica по умолчанию используется
+    # третий тип.
+    type_2 = 2
+    type_3 = 3
+
+
+class AnovaTerm:
+    # Строка таблицы дисперсионного анализа: эффект, сумма квадратов, степени свободы, F и p.
+    def __init__(self, name, ss, df, f, p):
+        self.name = name
+        self.ss = ss
+        self.df = df
+        self.f = f
+        self.p = p
+
+    def __repr__(self):
+        return self.name + '\t' + str(self.ss) + '\t' + str(self.df) + '\t' + str(self.f) + '\t' + str(self.p)
+
+
+class FactorialDesign:
+    # Факторный план эксперимента, построенный один раз по кодам уровней факторов. Все расчеты выполняются по ячейкам
+    # плана (сочетаниям уровней факторов), внутри ячейки пробам нужны только количество, среднее и сумма квадратов.
+    def __init__(self, factor_codes: list, factor_names: list):
+        if len(factor_codes) == 0 or len(factor_codes[0]) == 0:
+            raise ValueError('No grouped samples for the analysis of variance')
+        # Пустой план: ни у одной пробы не названы уровни всех факторов.
+        self.factor_names = factor_names
+        factorized = [numpy.unique(code, return_inverse=True) for code in factor_codes]
+        self.level_names = [levels.tolist() for levels, _ in factorized]
+        codes = numpy.column_stack([inverse.reshape(-1) for _, inverse in factorized])
+        # Уровни каждого фактора перенумеровываются подряд с нуля.
+        self.cells, self.cell_index = numpy.unique(codes, axis=0, return_inverse=True)
+        self.cell_index = self.cell_index.reshape(-1)
+        self.counts = numpy.bincount(self.cell_index, minlength=len(self.cells))
+        self.order = numpy.argsort(self.cell_index, kind='stable')
+        self.offsets = numpy.concatenate(([0], numpy.cumsum(self.counts)[:-1])).astype(int)
+        # Пробы, упорядоченные по ячейкам, и смещения начала каждой ячейки.
+        self.levels = (codes.max(axis=0) + 1).tolist()
+        self.terms = []
+        for size in range(1, len(factor_names) + 1):
+            self.terms += list(itertools.combinations(range(len(factor_names)), size))
+        # Главные эффекты и все взаимодействия факторов.
+        self.term_columns = {}
+        for term in self.terms:
+            self.term_columns[term] = self.create_term_columns(term)
+
+    @staticmethod
+    def create_effect_columns(codes, number_of_levels):
+        # Кодирование уровней фактора с суммой эффектов, равной нулю: последний уровень кодируется строкой из -1.
+        coding = numpy.eye(number_of_levels)[:, :number_of_levels - 1]
+        coding[number_of_levels - 1] = -1
+        return coding[codes]
+
+    def create_term_columns(self, term):
+        # Столбцы матрицы плана для эффекта. Для взаимодействия это попарные произведения столбцов факторов.
+        columns = FactorialDesign.create_effect_columns(self.cells[:, term[0]], self.levels[term[0]])
+        for factor in term[1:]:
+            factor_columns = FactorialDesign.create_effect_columns(self.cells[:, factor], self.levels[factor])
+            columns = (columns[:, :, None] * factor_columns[:, None, :]).reshape(len(self.cells), -1)
+        return columns
+
+    def cell_names(self, cell):
+        # Названия уровней факторов для ячейки плана.
+        return [self.level_names[factor][code] for factor, code in enumerate(self.cells[cell].tolist())]
+
+    def term_name(self, term):
+        return ' x '.join(self.factor_names[factor] for factor in term)
+
+    def find_cell_statistics(self, concs):
+        # Среднее каждой ячейки и общая внутриячеечная сумма квадратов. Концентрации могут быть матрицей
+        # проба x ген, тогда расчет идет сразу для всех столбцов.
+        concs = numpy.asarray(concs, dtype=float)
+        counts = self.counts.reshape((-1,) + (1,) * (concs.ndim - 1))
+        means = numpy.add.reduceat(concs[self.order], self.offsets, axis=0) / counts
+        within_ss = numpy.sum((concs - means[self.cell_index]) ** 2, axis=0)
+        return means, within_ss
+
+    def find_cell_sums_of_squares(self, concs, means):
+        # Сумма квадратов отклонений от среднего внутри каждой ячейки.
+        deviations = numpy.asarray(concs, dtype=float) - means[self.cell_index]
+        return numpy.add.reduceat(deviations[self.order] ** 2, self.offsets, axis=0)
+
+    def find_residual(self, terms, means, within_ss, counts=None):
+        # Остаточная сумма квадратов и ранг модели из указанных эффектов. Столбцы модели постоянны внутри ячеек,
+        # поэтому модель подбирается по средним ячеек с весами, равными количеству проб в ячейке. Пустые ячейки
+        # получают нулевой вес и не влияют на модель.
+        counts = self.counts if counts is None else counts
+        design = numpy.column_stack([numpy.ones(len(self.cells))] + [self.term_columns[term] for term in terms])
+        weights = numpy.sqrt(counts).reshape((-1,) + (1,) * (means.ndim - 1))
+        weighted_design = design * numpy.sqrt(counts)[:, None]
+        means = numpy.where(weights > 0, means, 0)
+        coefficients, _, rank, _ = numpy.linalg.lstsq(weighted_design, means * weights, rcond=None)
+        fitted = design @ coefficients
+        residual_ss = within_ss + numpy.sum((weights * (means - fitted)) ** 2, axis=0)
+        return residual_ss, rank
+
+    def find_anova(self, concs, ss_type: SumOfSquaresType = SumOfSquaresType.type_3):
+        # Таблица дисперсионного анализа для всех эффектов плана и остаточная дисперсия (последняя строка).
+        means, within_ss = self.find_cell_statistics(concs)
+        return self.find_anova_for_cells(self.counts, means, within_ss, ss_type)
+
+    def find_anova_for_cells(self, counts, means, within_ss, ss_type: SumOfSquaresType = SumOfSquaresType.type_3):
+        # Таблица дисперсионного анализа по количеству проб, средним ячеек и общей внутриячеечной сумме квадратов.
+        # Отдельные пробы для расчета не нужны.
+        full_ss, full_rank = self.find_residual(self.terms, means, within_ss, counts)
+        error_df = int(numpy.sum(counts)) - full_rank
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            error_ms = full_ss / error_df
+        results = []
+        for term in self.terms:
+            if ss_type == SumOfSquaresType.type_3:
+                # Эффект сравнивается с полной моделью, из которой убран только этот эффект.
+                reduced_ss, reduced_rank = self.find_residual([t for t in self.terms if t != term], means, within_ss,
+                                                              counts)
+                term_ss = reduced_ss - full_ss
+                term_df = full_rank - reduced_rank
+            else:
+                # Эффект добавляется к модели из всех эффектов, которые его не содержат.
+                base_terms = [t for t in self.terms if not set(term) <= set(t)]
+                base_ss, base_rank = self.find_residual(base_terms, means, within_ss, counts)
+                term_ss_with, rank_with = self.find_residual(base_terms + [term], means, within_ss, counts)
+                term_ss = base_ss - term_ss_with
+                term_df = rank_with - base_rank
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                f = (term_ss / term_df) / error_ms
+            results.append(AnovaTerm(self.term_name(term), term_ss, term_df, f, scipy.stats.f.sf(f, term_df, error_df)))
+        results.append(AnovaTerm('error', full_ss, error_df, numpy.nan, numpy.nan))
+        return results
@@ -0,0 +1,188 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+
+class Span:
+    # Именованный интервал времени. При выходе из интервала в трассу записывается событие с его началом,
+    # длительностью и, если включено, пиком выделенной памяти внутри интервала.
+    __slots__ = ('name', 'arguments', 'start', 'peak')
+
+    def __init__(self, name, arguments):
+        self.name = name
+        self.arguments = arguments
+        self.start = 0.0
+        self.peak = 0
+
+    def __enter__(self):
+        stack = Trace.stack()
+        if Trace.memory:
+            Trace.update_peak(stack)
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        end = time.perf_counter()
+        stack = Trace.stack()
+        stack.pop()
+        arguments = dict(self.arguments)
+        if Trace.memory:
+            Trace.update_peak([self])
+            arguments['peak memory'] = self.peak
+            if len(stack) > 0:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+                # Пик вложенного интервала входит в пик внешнего.
+        if exception_type is not None:
+            arguments['error'] = exception_type.__name__
+        Trace.add_event({'name': self.name, 'ph': 'X', 'ts': Trace.timestamp(self.start),
+                         'dur': round((end - self.start) * 1e6, 1), 'args': arguments})
+        return False
+
+
+class NoSpan:
+    # Интервал, который ничего не делает, - используется, когда трасса выключена.
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        return False
+
+
+class Trace:
+    # Трасса выполнения: интервалы времени, счетчики и пики памяти основных этапов обработки. Трасса включается и
+    # выключается во время работы программы (методами enable/disable, переменной окружения PCR_TRACE или параметром
+    # --trace пакетной обработки). Пока трасса выключена, отмеченные функции только проверяют флаг enabled.
+    # События накапливаются в памяти и дописываются в файл методом flush, поэтому в один файл можно писать из
+    # нескольких процессов и нескольких запусков. Файл .jsonl содержит по одному событию JSON в строке, файл с другим
+    # расширением - массив событий в формате Chrome trace (chrome://tracing, Perfetto), закрывающая скобка в котором
+    # не обязательна.
+    enabled = False
+    memory = False
+    # Пик памяти считается через tracemalloc, это заметно замедляет работу, поэтому включается отдельно.
+    path = None
+    events = []
+    counters = {}
+    lock = threading.Lock()
+    local = threading.local()
+    no_span = NoSpan()
+    wall_start = 0.0
+    perf_start = 0.0
+    environment_variable = 'PCR_TRACE'
+
+    @staticmethod
+    def enable(path, memory=False):
+        # Включение трассы с записью в файл path. Повторное включение с тем же файлом ничего не меняет.
+        if Trace.enabled and Trace.path == path:
+            return
+        if Trace.enabled:
+            Trace.disable()
+        Trace.path = path
+        Trace.wall_start = time.time()
+        Trace.perf_start = time.perf_counter()
+        Trace.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        Trace.enabled = True
+        if not path.endswith('.jsonl') and (not os.path.exists(path) or os.path.getsize(path) == 0):
+            with open(path, 'a') as file:
+                file.write('[\n')
+            # Начало массива событий Chrome trace записывается один раз, до запуска процессов пакетной обработки.
+        atexit.unregister(Trace.flush)
+        atexit.register(Trace.flush)
+
+    @staticmethod
+    def disable():
+        # Выключение трассы, накопленные события записываются в файл.
+        Trace.flush()
+        if Trace.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        Trace.enabled = False
+        Trace.memory = False
+
+    @staticmethod
+    def enable_from_environment():
+        # Включение трассы, если задана переменная окружения PCR_TRACE с путем к файлу трассы.
+        path = os.environ.get(Trace.environment_variable)
+        if path:
+            Trace.enable(path, os.environ.get(Trace.environment_variable + '_MEMORY', '') not in ('', '0'))
+
+    @staticmethod
+    def span(name, **arguments):
+        if not Trace.enabled:
+            return Trace.no_span
+        return Span(name, arguments)
+
+    @staticmethod
+    def count(name, value=1):
+        # Увеличение счетчика. В трассу записывается новое значение счетчика.
+        if not Trace.enabled:
+            return
+        with Trace.lock:
+            Trace.counters[name] = Trace.counters.get(name, 0) + value
+            total = Trace.counters[name]
+        Trace.add_event({'name': name, 'ph': 'C', 'ts': Trace.timestamp(time.perf_counter()), 'args': {name: total}})
+
+    @staticmethod
+    def stack():
+        # Открытые интервалы текущего потока.
+        if not hasattr(Trace.local, 'stack'):
+            Trace.local.stack = []
+        return Trace.local.stack
+
+    @staticmethod
+    def update_peak(spans):
+        # Пик памяти с момента последнего сброса засчитывается открытым интервалам, после чего пик сбрасывается. В
+        # Python до 3.9 сброса нет, тогда засчитывается пик с начала трассы.
+        peak = tracemalloc.get_traced_memory()[1]
+        for span in spans:
+            span.peak = max(span.peak, peak)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+    @staticmethod
+    def timestamp(perf_time):
+        # Время в микросекундах от начала эпохи, чтобы события разных процессов можно было сопоставить.
+        return round((Trace.wall_start + perf_time - Trace.perf_start) * 1e6, 1)
+
+    @staticmethod
+    def add_event(event):
+        event['cat'] = 'pcr'
+        event['pid'] = os.getpid()
+        event['tid'] = threading.get_ident()
+        with Trace.lock:
+            Trace.events.append(event)
+
+    @staticmethod
+    def flush():
+        # Дописывание накопленных событий в файл трассы одной записью.
+        with Trace.lock:
+            events, Trace.events = Trace.events, []
+        if Trace.path is None or len(events) == 0:
+            return
+        is_lines = Trace.path.endswith('.jsonl')
+        text = ''.join(json.dumps(event) + ('\n' if is_lines else ',\n') for event in events)
+        with open(Trace.path, 'a') as file:
+            file.write(text)
+
+
+def traced(name):
+    # Декоратор, который выполняет функцию внутри интервала name, если трасса включена.
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*arguments, **keywords):
+            if not Trace.enabled:
+                return function(*arguments, **keywords)
+            with Span(name, {}):
+                return function(*arguments, **keywords)
+        return wrapper
+    return decorator
+
+
+Trace.enable_from_environment()
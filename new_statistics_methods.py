@@ -1,42 +1,98 @@
 import functools
+import os
 import scipy
 from scipy import stats
 import numpy
 from enum import Enum
 import tkinter.filedialog as tk
-
-
-class PreparedSample:
-    # Класс объектов-проб, получаемых из файла.
-    def __init__(self, number, conc, control, line, comment):
-        self.number = number
-        self.conc = conc
-        self.control = control
-        self.line = line
-        self.comment = comment
-        self.is_checked = True
+from factorial_anova import FactorialDesign, SumOfSquaresType
+from instrumentation import Trace, traced
+from outlier_screening import OutlierFlag, OutlierScreening
+from pairwise_comparisons import ComparisonType, PairwiseComparisons
+from background_jobs import JobControls
+from result_cache import ResultCache
+from sample_table import CategoricalColumn, SampleRow, SampleTable, TableFile, TableKind
+
+
+class PreparedSample(SampleRow):
+    # Проба, получаемая из файла, - строка таблицы SampleList. Комментарий и отметка чек-бокса записываются в столбцы
+    # таблицы.
+    __slots__ = ()
+
+    @property
+    def comment(self):
+        comment = float(self.table.comments[self.index])
+        return '' if comment != comment else comment
+        # Незаполненный комментарий хранится как nan.
+
+    @comment.setter
+    def comment(self, value):
+        self.table.comments[self.index] = numpy.nan if value == '' else value
+
+    @property
+    def is_checked(self):
+        return bool(self.table.is_checked[self.index])
+
+    @is_checked.setter
+    def is_checked(self, value):
+        self.table.is_checked[self.index] = value
+
+    @property
+    def outlier_flag(self):
+        return OutlierFlag(int(self.table.outlier_flags[self.index]))
+
+    @outlier_flag.setter
+    def outlier_flag(self, value):
+        self.table.outlier_flags[self.index] = value
 
     def __repr__(self):
         return self.number + '\t' + str(self.conc) + '\t' + self.control + '\t' + self.line + '\t' + str(self.comment)
 
 
-class SampleList(list):
-    # Список объектов проб.
+class SampleList(SampleTable):
+    # Таблица проб из файла.
+    row_class = PreparedSample
+    column_names = SampleTable.column_names + ('comments', 'is_checked', 'outlier_flags')
+
     def __init__(self, file_name: str):
-        super().__init__()
-        file_text = SampleList.load_file(file_name)
-        for element in SampleList.parse_file_text(file_text):
-            self.append(element)
+        if file_name.endswith(TableFile.extension):
+            super().__init__(*SampleList.read_binary(file_name))
+            # Двоичная таблица из раздела Create full list читается без разбора текста.
+        else:
+            file_text = SampleList.load_file(file_name)
+            super().__init__(*SampleList.parse_file_text(file_text))
+        self.comments = numpy.full(len(self), numpy.nan)
+        self.is_checked = numpy.ones(len(self), dtype=bool)
+        self.outlier_flags = numpy.zeros(len(self), dtype=numpy.uint8)
 
     @staticmethod
+    @traced('statistics: parse')
     def parse_file_text(file_text):
-        # Разделение строчки на отдельные части и назначение полей класса Sample.
+        # Разделение строчек на отдельные части, возвращает столбцы таблицы. Если линия не указана, то она
+        # читается как 0. Столбцы после линии - дополнительные факторы, их названия берутся из заголовка.
+        numbers, concs, controls, lines = [], [], [], []
+        factor_names = str.split(file_text[0])[3:] if len(file_text) > 0 else []
+        factor_values = [[] for _ in factor_names]
         for line in file_text[1:]:
             parts = str.split(line)
-            try:
-                yield PreparedSample(parts[0], float(parts[1]), parts[2], parts[3], '')
-            except IndexError:
-                yield PreparedSample(parts[0], float(parts[1]), parts[2], 0, '')
+            numbers.append(parts[0])
+            concs.append(parts[1])
+            controls.append(parts[2])
+            lines.append(parts[3] if len(parts) > 3 else None)
+            for values, part in zip(factor_values, parts[4:] + [None] * len(factor_names)):
+                values.append(part)
+        factors = {name: CategoricalColumn.from_values(values) for name, values in zip(factor_names, factor_values)}
+        return numbers, numpy.asarray(concs, dtype=float), CategoricalColumn.from_values(controls), \
+            CategoricalColumn.from_values(lines), None, factors
+
+    @staticmethod
+    @traced('statistics: read binary')
+    def read_binary(file_name):
+        columns = TableFile.read(file_name, TableKind.full_list)
+        factors = {name: column for name, column in columns.items()
+                   if name not in ('number', 'mean', 'control', 'line')}
+        # Остальные столбцы таблицы - дополнительные факторы.
+        return columns['number'], columns['mean'], columns['control'], columns['line'], None, factors
 
     @staticmethod
     def load_file(file_name):
@@ -63,109 +119,126 @@ class GroupType(Enum):
     Line = 2
 
 
-class GroupedSamples(list):
-    # Лист, который внутри имеет группы, состоящие из объектов. Группы сформированы в зависимости от типа группировки.
-    def __init__(self, source_samples: list, group_type: GroupType):
-        super().__init__()
-        sorted_samples = GroupedSamples.sort_samples(source_samples, group_type)
-        if group_type == GroupType.Control:
-            # Группировка по контролю/эксперименту.
-            for sample_group in GroupedSamples.group_samples_by_control(sorted_samples):
-                self.append(sample_group)
-        else:
-            for sample_group in GroupedSamples.group_samples(sorted_samples):
-                # Группировка по типу эксперементального воздействия.
-                self.append(sample_group)
-
-    def to_conc_lists(self):
-        # Превращение листа с группами объектов в лист с группами чисел-концентраций.
-        result = []
-        for group in self:
-            inner_group = [x.conc for x in group]
-            result.append(numpy.asarray(inner_group))
-        return result
-
-    @staticmethod
-    def sort_samples(source_samples, group_type: GroupType):
-        # Сортировка объектов в зависимости от типа группировки. В конце всех сортировок внутри каждой группы объекты
-        # сортированы по увеличению концентраций.
-        result = []
+class GroupingIndex:
+    # Индекс для группирования проб. Значения факторов (контроль/эксперимент, линия, дополнительные факторы) один раз
+    # переводятся в номера уровней, после чего любое группирование получается одной устойчивой сортировкой номеров и
+    # концентраций, без сравнения строк. Факторы плана (factor_names) - контроль и те из остальных факторов, которые
+    # указаны хотя бы у одной пробы. Группы типа Normal - сочетания уровней всех факторов плана.
+
+    @traced('statistics: grouping index')
+    def __init__(self, samples: list, factor_names: list = None):
+        self.samples = list(samples)
+        self.concs = numpy.array([sample.conc for sample in self.samples], dtype=float)
+        self.level_names = {}
+        self.codes = {}
+        self.is_unnamed = {}
+        self.is_missing = {}
+        table_factors = self.samples[0].table.factor_names() if len(self.samples) > 0 else ['control', 'line']
+        for name in table_factors:
+            values = [sample.factor(name) for sample in self.samples]
+            levels, codes = numpy.unique(numpy.array(values, dtype=object).astype(str), return_inverse=True)
+            self.level_names[name] = levels.tolist()
+            self.codes[name] = codes.reshape(-1)
+            self.is_unnamed[name] = numpy.array([value == '0' for value in values], dtype=bool)
+            # Пробы, у которых уровень фактора назван '0', не входят в группы по этому фактору.
+            self.is_missing[name] = all(value == 0 for value in values)
+            # Фактор не указан ни у одной пробы (не указанное значение читается как 0).
+        if factor_names is None:
+            factor_names = [name for name in table_factors if name == 'control' or not self.is_missing[name]]
+        self.factor_names = list(factor_names)
+
+    def factors_of(self, group_type: GroupType):
+        # Факторы, сочетания уровней которых образуют группы указанного типа.
         if group_type == GroupType.Normal:
-            result = sorted(source_samples, key=lambda item: (item.control, item.line, item.conc))
-        elif group_type == GroupType.Control:
-            result = sorted(source_samples, key=lambda item: (item.control, item.conc))
-        elif group_type == GroupType.Line:
-            result = sorted(source_samples, key=lambda item: (item.line, item.conc))
-        return result
+            return self.factor_names
+        return ['control'] if group_type == GroupType.Control else ['line']
+
+    def find_included(self, factor_names):
+        # Пробы, у которых названы уровни всех указанных факторов.
+        included = numpy.ones(len(self.samples), dtype=bool)
+        for name in factor_names:
+            included &= ~self.is_unnamed[name]
+        return included
+
+    def find_groups(self, factor_names):
+        # Номера проб каждой группы. Группы упорядочены по уровням факторов, внутри группы пробы упорядочены по
+        # увеличению концентраций.
+        order = numpy.lexsort([self.concs] + [self.codes[name] for name in reversed(factor_names)])
+        order = order[self.find_included(factor_names)[order]]
+        if len(order) == 0:
+            return []
+        is_new_group = numpy.zeros(len(order), dtype=bool)
+        for name in factor_names:
+            is_new_group[1:] |= self.codes[name][order][1:] != self.codes[name][order][:-1]
+        return numpy.split(order, numpy.flatnonzero(is_new_group))
+
+    def factor_codes(self, factor_names):
+        # Номера уровней указанных факторов для проб, которые входят в группы по этим факторам.
+        included = self.find_included(factor_names)
+        return [self.codes[name][included] for name in factor_names], self.concs[included]
+
+    def create_design(self, factor_names):
+        # Факторный план по номерам уровней и концентрации проб, которые входят в план. В плане номера уровней
+        # заменяются названиями уровней.
+        factor_codes, concs = self.factor_codes(factor_names)
+        design = FactorialDesign(factor_codes, factor_names)
+        design.level_names = [[self.level_names[name][code] for code in codes]
+                              for name, codes in zip(factor_names, design.level_names)]
+        return design, concs
 
-    @staticmethod
-    def group_samples(sorted_samples):
-        # Создание групп из объектов, основываясь на поле линия (влияния линия не заполнено, то объект пропускается.
-        if len(sorted_samples) > 0:
-            templist = []
-            temp_group = []
-            temp_line = None
-            for elem in sorted_samples:
-                if elem.line == '0':
-                    continue
-                if elem.line == temp_line:
-                    temp_group.append(elem)
-                else:
-                    if len(temp_group) > 0:
-                        yield temp_group
-                    temp_group = [elem]
-                    temp_line = elem.line
-            yield temp_group
-            templist.append(temp_group)
 
-    @staticmethod
-    def group_samples_by_control(sorted_samples):
-        # Создание групп из объектов, основываясь на поле контроль (конторль/эксперимент).
-        if len(sorted_samples) > 0:
-            templist = []
-            temp_group = []
-            temp_control = None
-            for elem in sorted_samples:
-                if elem.control == '0':
-                    continue
-                if elem.control == temp_control:
-                    temp_group.append(elem)
-                else:
-                    if len(temp_group) > 0:
-                        yield temp_group
-                    temp_group = [elem]
-                    temp_control = elem.control
-            yield temp_group
-            templist.append(temp_group)
+class GroupedSamples(list):
+    # Лист, который внутри имеет группы, состоящие из объектов. Группы сформированы в зависимости от типа группировки.
+    # Если индекс группирования уже построен для этих проб, то он используется повторно.
+    @traced('statistics: grouping')
+    def __init__(self, source_samples: list, group_type: GroupType, index: GroupingIndex = None):
+        super().__init__()
+        self.index = GroupingIndex(source_samples) if index is None else index
+        self.positions = self.index.find_groups(self.index.factors_of(group_type))
+        for positions in self.positions:
+            self.append([self.index.samples[position] for position in positions.tolist()])
+        self.build_arrays()
+        Trace.count('statistics: groups', len(self))
+
+    def build_arrays(self):
+        # Концентрации всех групп записываются один раз в общий массив, группа задается смещением начала группы и
+        # количеством проб в ней.
+        self.counts = numpy.array([len(group) for group in self], dtype=int)
+        self.offsets = numpy.concatenate(([0], numpy.cumsum(self.counts)[:-1])).astype(int)
+        self.concs = self.index.concs[numpy.concatenate(self.positions)] if len(self) > 0 else numpy.zeros(0)
+
+    def find_group_means(self):
+        # Среднее каждой группы через суммы по отрезкам общего массива.
+        return numpy.add.reduceat(self.concs, self.offsets) / self.counts
+
+    def find_sums_of_squares(self):
+        # Сумма квадратов отклонений от среднего внутри каждой группы.
+        deviations = self.concs - numpy.repeat(self.find_group_means(), self.counts)
+        return numpy.add.reduceat(deviations ** 2, self.offsets)
 
 
 class GroupStatistics(GroupedSamples):
-    def __init__(self, source_samples: list, group_type: GroupType):
-        super().__init__(source_samples, group_type)
+    def __init__(self, source_samples: list, group_type: GroupType, index: GroupingIndex = None):
+        super().__init__(source_samples, group_type, index)
 
     def __repr__(self):
         pass
 
+    @traced('statistics: outlier screening')
     def fill_comments(self):
         # Метод заполняет поле комментарии. коментарий - это число, которое показывает необходимость убрать выделяющийся
         # крайний результат или оставить его. Для каждой группы комментарии представлены для трех первый и трех
-        # последних проб.
-        for group in self:
-            length = len(group)
-            for a in range(0, 3):
-                first_element = group[a].conc
-                next_element = group[a + 1].conc
-                penult_element = group[- 2].conc
-                if penult_element > first_element:
-                    min_val = round(((next_element - first_element) / (penult_element - first_element)), 2)
-                    group[a].comment = min_val
-            for b in range(int(length - 3), int(length)):
-                last_element = group[b].conc
-                second_element = group[2].conc
-                penult_element = group[b - 1].conc
-                if last_element > second_element:
-                    max_val = round((last_element - penult_element) / (last_element - second_element), 2)
-                    group[b].comment = max_val
+        # последних проб. Отношения считаются сразу для всех групп, в группах меньше четырех проб комментариев нет.
+        # Кроме того, каждая проба получает отметки выпадающего значения по критериям Диксона, Граббса и
+        # модифицированному z.
+        screening = OutlierScreening(self.concs, self.offsets, self.counts)
+        ratios = screening.find_comment_ratios().tolist()
+        flags = screening.find_flags().tolist()
+        samples = [sample for group in self for sample in group]
+        for sample, ratio, flag in zip(samples, ratios, flags):
+            if ratio == ratio:
+                sample.comment = round(ratio, 2)
+            sample.outlier_flag = flag
 
     # Здесь начинаются методы, осуществляющие непосредственно статистическую обработку результатов. в общепринятой
     # практике это выполняется в прогремме Statistica.
@@ -177,42 +250,29 @@ class GroupStatistics(GroupedSamples):
         df = total_count - 1
         return df
 
-    # @staticmethod
-    # В Statistica - effective size.
-    def find_line_interaction_two_way(self, control_group_list: GroupedSamples, line_group_list: GroupedSamples):
-        cont_f, cont_p = scipy.stats.f_oneway(*control_group_list.to_conc_lists())  # Для подсчета влияния каждого
-        # фактора необходимо сгруппировать по факторам весь список проб
-        cont_df = len(control_group_list.to_conc_lists())
-        line_f, line_p = scipy.stats.f_oneway(*line_group_list.to_conc_lists())
-        line_df = len(line_group_list.to_conc_lists())
-        cxl_f, cxl_p = scipy.stats.f_oneway(*self.to_conc_lists())
-        cxl_df = len(self.to_conc_lists())
-        return cont_f, cont_p, cont_df, line_f, line_p, line_df, cxl_f, cxl_p, cxl_df
-
     @staticmethod
-    def find_line_interaction_one_way(control_group_list: GroupedSamples):
-        cont_f, cont_p = scipy.stats.f_oneway(*control_group_list.to_conc_lists())
-        cont_df = len(control_group_list.to_conc_lists())
-        return cont_f, cont_p, cont_df
+    @traced('statistics: anova')
+    def find_influence_of_factors(index: GroupingIndex, ss_type: SumOfSquaresType):
+        # Факторный дисперсионный анализ по всему списку проб: влияние каждого фактора плана и всех их сочетаний (для
+        # однофакторного анализа только контроля). План строится по номерам уровней из индекса группирования, без
+        # перегруппировки проб по каждому фактору. Пробы без названия группы не входят в анализ.
+        design, concs = index.create_design(index.factor_names)
+        return design.find_anova(concs, ss_type)
 
     def find_weighted_mean(self):
-        conc_array = self.to_conc_lists()
-        averages = []
-        for group in conc_array:
-            averages.append(numpy.ma.average(group))
-        return averages
+        return self.find_group_means().tolist()
 
     def find_standard_error(self):
-        list_of_st_err = []
-        for group in self.to_conc_lists():
-            standard_error = scipy.stats.sem(group)
-            list_of_st_err.append(standard_error)
-        return list_of_st_err
+        # Ошибка среднего по несмещенной дисперсии каждой группы.
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            variances = self.find_sums_of_squares() / (self.counts - 1)
+        return numpy.sqrt(variances / self.counts).tolist()
 
-    @staticmethod
-    def find_differences_with_fisher(item1, item2):
-        result = scipy.stats.f_oneway(item1, item2)
-        return result
+    @traced('statistics: pairwise comparisons')
+    def find_pairwise_comparisons(self, comparison_type: ComparisonType):
+        # Матрица p для попарного сравнения групп по количеству проб, среднему и сумме квадратов каждой группы.
+        comparisons = PairwiseComparisons(self.counts, self.find_group_means(), self.find_sums_of_squares())
+        return comparisons.to_matrix(comparisons.find_p_values(comparison_type))
 
 
 class Influence:
@@ -227,15 +287,17 @@ class Influence:
 
 
 class NamedGroup:
-    # Класс с объектами-группами проб.
-    def __init__(self, group, cont, line, number):
+    # Класс с объектами-группами проб. Уровни дополнительных факторов выводятся после линии.
+    def __init__(self, group, cont, line, number, factors=()):
         self.group = group
         self.cont = cont
         self.line = line
         self.number = number
+        self.factors = factors
 
     def __repr__(self):
-        return str(self.group) + '\t' + str(self.cont) + '\t' + str(self.line) + '\t' + str(self.number)
+        factors = ''.join('\t' + str(factor) for factor in self.factors)
+        return str(self.group) + '\t' + str(self.cont) + '\t' + str(self.line) + factors + '\t' + str(self.number)
 
 
 class AverageWithError:
@@ -249,37 +311,151 @@ class AverageWithError:
         return str(self.group_number) + '\t' + str(self.average) + '\t' + str(self.error)
 
 
+class GenePanelStatistics:
+    # Общий план эксперимента для панели генов: пробы без названия группы исключаются, остальные группируются по
+    # всем факторам плана один раз для всех генов.
+    def __init__(self, panel):
+        factors = [('control', panel.controls)]
+        if any(line != '' for line in panel.lines):
+            factors.append(('line', panel.lines))
+        factors += [(name, values) for name, values in panel.factors.items() if any(value != '0' for value in values)]
+        # Линия и дополнительные факторы входят в план, если они указаны хотя бы у одной пробы.
+        self.factor_names = [name for name, _ in factors]
+        is_grouped = numpy.ones(len(panel.controls), dtype=bool)
+        for _, values in factors:
+            is_grouped &= numpy.asarray(values) != '0'
+        self.concs = panel.comparisons[is_grouped]
+        self.design = FactorialDesign([numpy.asarray(values)[is_grouped] for _, values in factors], self.factor_names)
+
+    def find_means_and_errors(self):
+        # Средние и ошибки средних для каждой группы и каждого гена.
+        means, _ = self.design.find_cell_statistics(self.concs)
+        counts = self.design.counts[:, None]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            variances = self.design.find_cell_sums_of_squares(self.concs, means) / (counts - 1)
+        return means, numpy.sqrt(variances / counts)
+
+    @traced('statistics: pairwise comparisons')
+    def find_pairwise_comparisons(self, comparison_type: ComparisonType):
+        # Матрицы p попарного сравнения групп, третье измерение - гены.
+        means, _ = self.design.find_cell_statistics(self.concs)
+        sums_of_squares = self.design.find_cell_sums_of_squares(self.concs, means)
+        comparisons = PairwiseComparisons(self.design.counts, means, sums_of_squares)
+        return comparisons.to_matrix(comparisons.find_p_values(comparison_type))
+
+
+class RunningGroupStatistics:
+    # Достаточные статистики групп (количество отмеченных проб, сумма и сумма квадратов концентраций), которые
+    # обновляются при снятии или установке отметки одной пробы за O(1), без перегруппировки всего списка. По ним сразу
+    # пересчитываются средние, ошибки средних и дисперсионный анализ. Группы - ячейки того же факторного плана, что и
+    # в полном расчете. Суммы считаются от первой концентрации группы, чтобы сумма квадратов не теряла точность при
+    # вычитании.
+    def __init__(self, samples: list):
+        index = GroupingIndex(samples)
+        self.concs = index.concs
+        self.factor_names = index.factor_names
+        is_grouped = index.find_included(self.factor_names)
+        # Пробы без названия группы не входят в анализ, для них номер ячейки равен -1.
+        self.design = index.create_design(self.factor_names)[0]
+        self.cell_of = numpy.full(len(samples), -1)
+        self.cell_of[is_grouped] = self.design.cell_index
+        self.shifts = self.concs[is_grouped][self.design.order][self.design.offsets]
+        self.counts = numpy.zeros(len(self.design.cells), dtype=int)
+        self.sums = numpy.zeros(len(self.design.cells))
+        self.squares = numpy.zeros(len(self.design.cells))
+        self.is_checked = numpy.zeros(len(samples), dtype=bool)
+        for position, sample in enumerate(samples):
+            self.set_checked(position, sample.is_checked)
+
+    def set_checked(self, position, is_checked: bool):
+        # Изменение отметки пробы с номером position в исходном списке.
+        cell = self.cell_of[position]
+        if cell < 0 or self.is_checked[position] == is_checked:
+            return
+        self.is_checked[position] = is_checked
+        sign = 1 if is_checked else -1
+        deviation = self.concs[position] - self.shifts[cell]
+        self.counts[cell] += sign
+        self.sums[cell] += sign * deviation
+        self.squares[cell] += sign * deviation ** 2
+        if self.counts[cell] == 0:
+            self.sums[cell] = 0
+            self.squares[cell] = 0
+            # В пустой группе накопленная ошибка округления сбрасывается.
+
+    def find_means_and_errors(self):
+        # Средние, ошибки средних и внутригрупповые суммы квадратов для всех групп. Для пустых групп - nan.
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            means = self.shifts + self.sums / self.counts
+            sums_of_squares = numpy.maximum(self.squares - self.sums ** 2 / self.counts, 0)
+            errors = numpy.sqrt(sums_of_squares / (self.counts - 1) / self.counts)
+        return means, errors, sums_of_squares
+
+    def find_anova(self, ss_type: SumOfSquaresType):
+        means, _, sums_of_squares = self.find_means_and_errors()
+        return self.design.find_anova_for_cells(self.counts, means, numpy.nansum(sums_of_squares), ss_type)
+
+
 class LogicLayer:
     # Логическая составляющая интерфейса.
     sample_list = []
 
+    def __init__(self, cache: ResultCache = None):
+        self.cache = cache
+        # Кэш результатов на диске. Если кэш не задан, то все считается заново.
+
     def open_work_file(self):
         # Метод кнопки открытия файла с данныи, готовыми к статистической обработке. Возвращает набор строчек и полное
         # имя файла. В процессе работы заполняет поля "Комментарий".
         open_path = tk.askopenfilename()
         file_name = open_path
-        samples = SampleList(file_name)
-        if samples[1].line != 0:
-            allsamples = GroupStatistics(samples, GroupType.Normal)
+        return self.load_work_file(file_name), file_name
+
+    @traced('statistics: load file')
+    def load_work_file(self, file_name):
+        # Чтение файла по известному пути, возвращает список проб с заполненными комментариями.
+        if self.cache is not None:
+            samples = self.cache.get_or_compute(ResultCache.key('prepared samples', self.cache.file_hash(file_name),
+                                                                os.path.splitext(file_name)[1]),
+                                                lambda: SampleList(file_name))
         else:
-            allsamples = GroupStatistics(samples, GroupType.Control)
+            samples = SampleList(file_name)
+        allsamples = GroupStatistics(samples, GroupType.Normal)
+        # Группы - сочетания уровней всех факторов плана, для однофакторного плана - только контроль.
         allsamples.fill_comments()
         self.sample_list = []
         for supersample in allsamples:
             for sample in supersample:
                 self.sample_list.append(sample)
-        return self.sample_list, file_name
+        return self.sample_list
 
     @staticmethod
-    def resume_processing(full_list):
+    def resume_processing(full_list, ss_type=SumOfSquaresType.type_3, comparison_type=ComparisonType.fisher, job=None,
+                          cache: ResultCache = None):
         # Метод продолжения работы после указания всех проб, которые должны принять участие в статистической обработке.
-        # Возвращает список, в который построчно записаны результаты статистической обработки.
-        results = []
+        # Возвращает список, в который построчно записаны результаты статистической обработки. Если метод выполняется
+        # в фоновой задаче job, то он сообщает ей о ходе работы. Если задан кэш, то результат ищется в нем по
+        # содержимому отмеченных проб и параметрам обработки, поэтому возврат к прежнему набору отметок не требует
+        # повторного расчета.
         samples = SampleListWithoutBads(full_list)
-        if samples[1].line != 0:
-            tempsamples = GroupStatistics(samples, GroupType.Normal)
-        else:
-            tempsamples = GroupStatistics(samples, GroupType.Control)
+        if cache is None:
+            return LogicLayer.find_results(samples, ss_type, comparison_type, job)
+        key = ResultCache.key('statistics', [sample.number for sample in samples],
+                              numpy.array([sample.conc for sample in samples]),
+                              [[sample.factor(name) for sample in samples]
+                               for name in full_list[0].table.factor_names()], ss_type, comparison_type)
+        return cache.get_or_compute(key, lambda: LogicLayer.find_results(samples, ss_type, comparison_type, job))
+
+    @staticmethod
+    @traced('statistics: results')
+    def find_results(samples, ss_type, comparison_type, job=None):
+        # Статистическая обработка отмеченных проб.
+        if job is not None:
+            job.report_progress('Grouping samples')
+        results = []
+        tempsamples = GroupStatistics(samples, GroupType.Normal)
+        factor_names = tempsamples.index.factor_names
+        other_factors = [name for name in factor_names if name not in ('control', 'line')]
 
         degree_of_freedom = tempsamples.find_degree_of_freedom()
         df_result = 'degree of freedom = ' + str(degree_of_freedom)
@@ -287,23 +463,12 @@ class LogicLayer:
         results.append(df_result)
         results.append('')
 
+        if job is not None:
+            job.report_progress('Analysis of variance')
         results.append('Influence of factors:')
-        # Возвращает влияние факторов "линия" и "эксперимент" и сочетания факторов.
-        if samples[1].line != 0:
-            cont_f, cont_p, cont_df, line_f, line_p, line_df, cxl_f, cxl_p, cxl_df = tempsamples.find_line_interaction_two_way \
-                (GroupStatistics(samples, GroupType.Control), GroupStatistics(samples, GroupType.Line))
-            results.append('control: F(' + str(cont_df) + ', ' + str(degree_of_freedom) + ')=' +
-                           str(round(cont_f, 2)) + ' p=' + str(round(cont_p, 3)) + '\n' + 'line: F(' + str(line_df) +
-                           ', ' + str(degree_of_freedom) + ')=' + str(round(line_f, 2)) + ' p=' +
-                           str(round(line_p, 3)) + '\n' + 'cont x line: F(' + str(cxl_df) + ', ' +
-                           str(degree_of_freedom) + ')=' + str(round(cxl_f, 2)) + ' p=' +
-                           str(round(cxl_p, 3)))
-        else:
-            cont_f, cont_p, cont_df = tempsamples.find_line_interaction_one_way(GroupStatistics(samples, GroupType.Control))
-            results.append('control: F(' + str(cont_df) + ', ' + str(degree_of_freedom)
-                           + ')=' + str(round(cont_f, 2)) +
-                           ' p=' + str(round(cont_p, 3)))
-
+        # Возвращает влияние факторов "линия" и "эксперимент" (и дополнительных факторов) и сочетания факторов.
+        anova = GroupStatistics.find_influence_of_factors(tempsamples.index, ss_type)
+        results += LogicLayer.format_anova(anova)
         results.append('')
 
         results.append('Groups:')
@@ -313,10 +478,9 @@ class LogicLayer:
             row_of_concs_in_group = ''
             for i in range(0, len(group)):
                 row_of_concs_in_group = row_of_concs_in_group + str(group[i].conc) + '\t'
-            if samples[1].line != 0:
-                results.append(NamedGroup(index, group[0].control, group[0].line, row_of_concs_in_group))
-            else:
-                results.append(NamedGroup(index, group[0].control, '', row_of_concs_in_group))
+            line = group[0].line if 'line' in factor_names else ''
+            results.append(NamedGroup(index, group[0].control, line, row_of_concs_in_group,
+                                      [group[0].factor(name) for name in other_factors]))
             index += 1
         results.append('')
 
@@ -329,37 +493,123 @@ class LogicLayer:
             results.append(AverageWithError(i+1, round(averages[i], 3), round(list_of_st_err[i], 3)))
         results.append('')
 
-        if samples[1].line != 0:
-            results.append('Fisher analysis')
-            # Возвращает результаты анализа-сравнения каждой группы с любой другой по Фишеру.
-            row_1 = '\t'
-            for index in range(0, len(tempsamples)):
-                row_1 = row_1 + str(index+1) + '\t'
-            results.append(row_1)
-            conc_tempsamples = tempsamples.to_conc_lists()
-            i = 1
-            for index_1 in conc_tempsamples:
-                row = str(i) + '\t'
-                for index_2 in conc_tempsamples:
-                    f, p = GroupStatistics.find_differences_with_fisher(index_1, index_2)
-                    if p == 1.0:
-                        p = 1
-                    if p < 0.05:
-                        row = row + '*' + str(round(p, 3)) + '*' + '\t'
-                    else:
-                        row = row + str(round(p, 3)) + '\t'
-                results.append(row)
-                i += 1
+        if len(factor_names) > 1:
+            if job is not None:
+                job.report_progress('Pairwise comparisons')
+            results.append('Pairwise comparisons (' + comparison_type.value + ')')
+            # Возвращает результаты сравнения каждой группы с любой другой, каждая пара групп сравнивается один раз.
+            p_matrix = tempsamples.find_pairwise_comparisons(comparison_type)
+            results += LogicLayer.format_comparison_matrix(p_matrix)
 
         return results
 
     @staticmethod
-    def save_results_to_file(full_list):
+    def format_anova(anova):
+        # Строки влияния факторов: F со степенями свободы эффекта и остатка и p.
+        error = anova[-1]
+        rows = []
+        for term in anova[:-1]:
+            rows.append(term.name + ': F(' + str(term.df) + ', ' + str(error.df) + ')=' +
+                        str(round(float(term.f), 2)) + ' p=' + str(round(float(term.p), 3)))
+        return rows
+
+    @staticmethod
+    def format_live_statistics(statistics: RunningGroupStatistics, ss_type=SumOfSquaresType.type_3):
+        # Краткая сводка по отмеченным пробам для панели, которая обновляется при каждом изменении отметки.
+        rows = ['Influence of factors:']
+        rows += LogicLayer.format_anova(statistics.find_anova(ss_type))
+        rows.append('')
+        rows.append('Groups:\tn\tmean\terror')
+        means, errors, _ = statistics.find_means_and_errors()
+        for cell in range(0, len(statistics.design.cells)):
+            rows.append(' '.join(statistics.design.cell_names(cell)) + '\t' + str(statistics.counts[cell]) + '\t' +
+                        str(round(float(means[cell]), 3)) + '\t' + str(round(float(errors[cell]), 3)))
+        return rows
+
+    @staticmethod
+    def format_comparison_matrix(p_matrix):
+        # Строки таблицы попарных сравнений групп, значимые различия отмечаются звездочками.
+        rows = []
+        row_1 = '\t'
+        for index in range(0, len(p_matrix)):
+            row_1 = row_1 + str(index+1) + '\t'
+        rows.append(row_1)
+        for i in range(0, len(p_matrix)):
+            row = str(i + 1) + '\t'
+            for p in p_matrix[i].tolist():
+                if p != p:
+                    row = row + '-' + '\t'
+                    # Группа не сравнивается сама с собой.
+                elif p < 0.05:
+                    row = row + '*' + str(round(p, 3)) + '*' + '\t'
+                else:
+                    row = row + str(round(p, 3)) + '\t'
+            rows.append(row)
+        return rows
+
+    @staticmethod
+    @traced('statistics: panel results')
+    def resume_panel_processing(panel, ss_type=SumOfSquaresType.type_3, comparison_type=ComparisonType.fisher):
+        # Статистическая обработка панели генов одним отчетом. План эксперимента строится один раз, дисперсионный
+        # анализ, средние с ошибками и попарные сравнения считаются сразу для матрицы проба x ген.
+        statistics = GenePanelStatistics(panel)
+        results = ['Genes: ' + '\t'.join(panel.gene_names), '']
+        results.append('degree of freedom = ' + str(len(statistics.concs) - 1))
+        results.append('')
+
+        results.append('Influence of factors:')
+        results.append('\t' + '\t'.join(panel.gene_names))
+        anova = statistics.design.find_anova(statistics.concs, ss_type)
+        error = anova[-1]
+        for term in anova[:-1]:
+            row = term.name
+            for f, p in zip(numpy.atleast_1d(term.f).tolist(), numpy.atleast_1d(term.p).tolist()):
+                row = row + '\t' + 'F(' + str(term.df) + ', ' + str(error.df) + ')=' + str(round(f, 2)) + ' p=' + \
+                      str(round(p, 3))
+            results.append(row)
+        results.append('')
+
+        results.append('Groups:')
+        for cell in range(0, len(statistics.design.cells)):
+            names = dict(zip(statistics.factor_names, statistics.design.cell_names(cell)))
+            results.append(NamedGroup(cell + 1, names.pop('control'), names.pop('line', ''),
+                                      'n=' + str(statistics.design.counts[cell]), list(names.values())))
+        results.append('')
+
+        results.append('Weighted means and st.errors')
+        results.append('\t' + '\t'.join(name + ' mean\t' + name + ' error' for name in panel.gene_names))
+        means, errors = statistics.find_means_and_errors()
+        for cell in range(0, len(means)):
+            row = str(cell + 1)
+            for mean, error in zip(means[cell].tolist(), errors[cell].tolist()):
+                row = row + '\t' + str(round(mean, 3)) + '\t' + str(round(error, 3))
+            results.append(row)
+        results.append('')
+
+        if len(statistics.factor_names) > 1:
+            results.append('Pairwise comparisons (' + comparison_type.value + ')')
+            p_matrices = statistics.find_pairwise_comparisons(comparison_type)
+            for gene in range(0, len(panel.gene_names)):
+                results.append(panel.gene_names[gene])
+                results += LogicLayer.format_comparison_matrix(p_matrices[:, :, gene])
+                results.append('')
+        return results
+
+    @staticmethod
+    def save_results_to_file(full_list, ss_type=SumOfSquaresType.type_3, comparison_type=ComparisonType.fisher,
+                             cache: ResultCache = None):
         # Метод сохранения результата в текстовый файл построчно.
         save_path = tk.asksaveasfilename(filetypes=[('text files', '.txt'), ('all files', '.*')],
                                          initialfile='ANOVA_result.txt')
+        LogicLayer.write_results(full_list, save_path, ss_type, comparison_type, cache)
+
+    @staticmethod
+    @traced('statistics: write results')
+    def write_results(full_list, save_path, ss_type=SumOfSquaresType.type_3, comparison_type=ComparisonType.fisher,
+                      cache: ResultCache = None):
+        # Запись результата в текстовый файл по известному пути.
         file = open(save_path, 'w')
-        for item in LogicLayer.resume_processing(full_list):
+        for item in LogicLayer.resume_processing(full_list, ss_type, comparison_type, cache=cache):
             file.write(str(item) + '\n')
         file.close()
 
@@ -367,9 +617,13 @@ class LogicLayer:
 class Interfacing:
     list_without_bads = []
     sample_list = []
+    page_size = 12
+    # Количество проб на одной странице.
+    samples_frame = None
+    live_statistics = None
 
     def __init__(self):
-        self.logic = LogicLayer()
+        self.logic = LogicLayer(ResultCache())
         root = tk.Tk()
         root.title('Statistic processing')
         # Создание основного окна.
@@ -383,6 +637,29 @@ class Interfacing:
 
         self.result_button = tk.Button(right_frame, text='Result', command=self.result_processing)
         self.result_button.pack(side='top', fill='x', pady=12)
+
+        tk.Label(right_frame, text='Sums of squares').pack(side='top', fill='x')
+        self.ss_type_names = {'type III': SumOfSquaresType.type_3, 'type II': SumOfSquaresType.type_2}
+        self.ss_type_var = tk.StringVar(root, value='type III')
+        tk.OptionMenu(right_frame, self.ss_type_var, *self.ss_type_names).pack(side='top', fill='x')
+        # Выбор типа сумм квадратов для несбалансированных планов.
+
+        tk.Label(right_frame, text='Comparisons').pack(side='top', fill='x')
+        self.comparison_var = tk.StringVar(root, value=ComparisonType.fisher.value)
+        tk.OptionMenu(right_frame, self.comparison_var, *[item.value for item in ComparisonType]).pack(side='top',
+                                                                                                     fill='x')
+        # Выбор способа попарного сравнения групп.
+
+        self.job_controls = JobControls(right_frame)
+        self.job_controls.pack(side='top', fill='x', pady=12)
+        # Строка состояния и кнопка отмены для обработки в фоновом потоке.
+
+        tk.Label(right_frame, text='Checked samples').pack(side='top', fill='x')
+        self.live_text = tk.Text(right_frame, width=40, height=16, wrap=tk.NONE)
+        self.live_text.pack(side='top', fill='both', expand=True)
+        self.live_text.config(state=tk.DISABLED)
+        # Панель со средними и влиянием факторов, которая обновляется сразу при изменении отметок проб.
+        self.ss_type_var.trace_add('write', lambda *arguments: self.show_live_statistics())
         right_frame.pack(side='right', fill='y', pady=4, padx=2)
 
         self.left_frame = tk.Frame(root)
@@ -405,147 +682,133 @@ class Interfacing:
             self.filename_entry.delete(0, tk.END)
             self.filename_entry.insert(0, file_path_text)
 
-            # Generating all the sample pages and storing them in object field.
-            self.pages_list = self.create_sample_elements_frame()
-            self.pages_list[0].pack()
-            self.active_page = self.pages_list[0]
-
-            self.page_buttons_frame = self.create_page_buttons_frame()
-            # Создание рамки в оснвном окне для группировки чек-боксов с пробами.
-            self.page_buttons_frame.pack(side='bottom', pady=10)
+            # Виджеты создаются один раз только для строк одной страницы, при смене страницы в них подставляются
+            # данные других проб.
+            if self.samples_frame is None:
+                self.samples_frame = self.create_sample_elements_frame()
+                self.samples_frame.pack()
+                self.page_buttons_frame = self.create_page_buttons_frame()
+                # Создание рамки в оснвном окне для группировки кнопок страниц.
+                self.page_buttons_frame.pack(side='bottom', pady=10)
+            self.show_page(0)
+            self.live_statistics = RunningGroupStatistics(self.sample_list)
+            self.show_live_statistics()
         # except Exception:
         #     error_text = 'Wrong file'
         #     self.open_error_window(error_text)
 
-    @staticmethod
-    def split(source: list, chunk_size: int):
-        # Разделение списка объектов по страницам. На каждой странице количество объектов равное chunk_size.
-        full_result = []
-        index = 0
-        while True:
-            result = source[index: index + chunk_size]
-            if len(result) == 0:
-                break
-            full_result.append(result)
-            index += chunk_size
-        return full_result
-
     def create_sample_elements_frame(self):
-        # Создание рамки для упорядочения чек-боксов и объектов.
-        all_pages = []
-        for result in Interfacing.split(self.sample_list, 12):
-            samples_frame = tk.Frame(self.left_frame)
-            tk.Label(samples_frame, text=" ").grid(column=0, row=0, padx=5, pady=2)
-            tk.Label(samples_frame, text="Number").grid(column=1, row=0, padx=5, pady=2)
-            tk.Label(samples_frame, text="Line").grid(column=2, row=0, padx=5, pady=2)
-            tk.Label(samples_frame, text="Concentration").grid(column=3, row=0, padx=5, pady=2)
-            tk.Label(samples_frame, text="Comment").grid(column=4, row=0, padx=5, pady=2)
-            # Создание строки с заголовками.
-            number_of_row = 1
+        # Создание рамки для упорядочения чек-боксов и объектов. Строк столько, сколько проб на одной странице.
+        samples_frame = tk.Frame(self.left_frame)
+        tk.Label(samples_frame, text=" ").grid(column=0, row=0, padx=5, pady=2)
+        tk.Label(samples_frame, text="Number").grid(column=1, row=0, padx=5, pady=2)
+        tk.Label(samples_frame, text="Line").grid(column=2, row=0, padx=5, pady=2)
+        tk.Label(samples_frame, text="Concentration").grid(column=3, row=0, padx=5, pady=2)
+        tk.Label(samples_frame, text="Comment").grid(column=4, row=0, padx=5, pady=2)
+        # Создание строки с заголовками.
+        self.rows = []
+        for row_index in range(0, self.page_size):
+            var = tk.BooleanVar(value=True)
+            f = functools.partial(self.check_sample, row_index=row_index)
+            check = tk.Checkbutton(samples_frame, text='', variable=var, onvalue=True, offvalue=False, command=f)
+            # Создание чек-боксов.
+            boxes = [tk.Entry(samples_frame) for _ in range(0, 4)]
+            # Текстовые поля для номера пробы, линии, концентрации и комментария.
+            self.rows.append((var, check, boxes))
+        return samples_frame
+
+    def show_page(self, page_index):
+        # Заполнение строк страницы данными проб. Отметка чек-бокса берется из поля is_checked пробы.
+        self.page_index = page_index
+        page = self.sample_list[page_index * self.page_size: (page_index + 1) * self.page_size]
+        current_control_and_line = None
+        current_color = 'white'
+        different_color = 'grey90'
+        for row_index, (var, check, boxes) in enumerate(self.rows):
+            if row_index >= len(page):
+                check.grid_remove()
+                for box in boxes:
+                    box.grid_remove()
+                continue
+            element = page[row_index]
             try:
-                current_control_and_line = result[0].control + '_' + result[0].line
+                new_control_and_line = element.control + '_' + element.line
             except TypeError:
-                current_control_and_line = result[0].control
-
-            current_color = 'white'
-            different_color = 'grey90'
-            for element in result:
-                var = tk.BooleanVar(value=True)
-                f = functools.partial(self.check_sample, element=element, checked=var)
-                check = tk.Checkbutton(samples_frame, text='', variable=var, onvalue=True, offvalue=False, command=f)
-                check.select()  # Setting this settings of checkbox by default.
-                check.grid(column=0, row=number_of_row)
-
-                # Окрашивание строк таблицы
-                try:
-                    new_control_and_line = element.control + '_' + element.line
-                except TypeError:
-                    new_control_and_line = element.control
-                if new_control_and_line == current_control_and_line:
-                    color = current_color
-                else:
-                    color = different_color
-                    current_color, different_color = different_color, current_color
-                    current_control_and_line = new_control_and_line
-
-                # Создание чек-боксов.
-
-                number_box = tk.Entry(samples_frame)
-                number_box.grid(column=1, row=number_of_row)
-                number_box.delete(0, tk.END)
-                number_box.insert(0, element.number)
-                number_box.config(background=color)
-                # Создание текстового поля для номера пробы.
-
-                line_box = tk.Entry(samples_frame)
-                line_box.grid(column=2, row=number_of_row)
-                line_box.delete(0, tk.END)
-                try:
-                    line_box.insert(0, element.control + '_' + element.line)
-                except TypeError:
-                    line_box.insert(0, element.control)
-                line_box.config(background=color)
-                # Создание текстового поля для линии (разное влияние эксперимента) пробы.
-
-                conc_box = tk.Entry(samples_frame)
-                conc_box.grid(column=3, row=number_of_row)
-                conc_box.delete(0, tk.END)
-                conc_box.insert(0, element.conc)
-                conc_box.config(background=color)
-                # Создание текстового поля для линии (контроль\эксперимент) пробы.
-
-                comment_box = tk.Entry(samples_frame)
-                comment_box.grid(column=4, row=number_of_row)
-                comment_box.delete(0, tk.END)
-                comment_box.insert(0, element.comment)
-                comment_box.config(background=color)
-                # Создание текстового поля для комментария для пробы.
-
-                number_of_row += 1
-
-            all_pages.append(samples_frame)
-        return all_pages
-
-    @staticmethod
-    def check_sample(element, checked):
-        checked_value = checked.get()
-        element.is_checked = checked_value
-        # Наполнение списка из отмеченных чекбоксов.
+                new_control_and_line = element.control
+            new_control_and_line += ''.join('_' + str(element.factor(name)) for name in element.table.factors)
+            # Окрашивание строк таблицы
+            if current_control_and_line is None or new_control_and_line == current_control_and_line:
+                color = current_color
+            else:
+                color = different_color
+                current_color, different_color = different_color, current_color
+            current_control_and_line = new_control_and_line
+
+            var.set(element.is_checked)
+            check.grid(column=0, row=row_index + 1)
+            for column, (box, value) in enumerate(zip(boxes, [element.number, new_control_and_line, element.conc,
+                                                              element.comment])):
+                box.grid(column=column + 1, row=row_index + 1)
+                box.delete(0, tk.END)
+                box.insert(0, value)
+                box.config(background=color)
+            if element.outlier_flag:
+                boxes[-1].config(background='salmon')
+                # Комментарий пробы, отмеченной хотя бы одним критерием выпадающих значений, выделяется цветом.
+        self.page_label['text'] = str(page_index + 1) + ' / ' + str(self.count_pages())
+
+    def count_pages(self):
+        return max((len(self.sample_list) + self.page_size - 1) // self.page_size, 1)
+
+    def check_sample(self, row_index):
+        # Отметка чек-бокса записывается в пробу, которая сейчас показана в этой строке, и в статистики ее группы.
+        var = self.rows[row_index][0]
+        position = self.page_index * self.page_size + row_index
+        self.sample_list[position].is_checked = var.get()
+        self.live_statistics.set_checked(position, var.get())
+        self.show_live_statistics()
+
+    def show_live_statistics(self):
+        if self.live_statistics is None:
+            return
+        rows = LogicLayer.format_live_statistics(self.live_statistics, self.ss_type_names[self.ss_type_var.get()])
+        self.live_text.config(state=tk.NORMAL)
+        self.live_text.delete(1.0, tk.END)
+        self.live_text.insert(tk.END, '\n'.join(rows))
+        self.live_text.config(state=tk.DISABLED)
 
     def create_page_buttons_frame(self):
         page_buttons_frame = tk.Frame(self.left_frame)
         # Создание рамки в основном окне для упорядочения кнопок страниц.
-        for page_index in range(0, len(self.pages_list)):
-            page_button = tk.Button(page_buttons_frame, text=str(page_index+1))
-            f = functools.partial(self.click_page_button, page_index=page_index, clicked_button=page_button)
-            page_button.config(command=f)
-            # Изменение отображаемого списка объектов при нажатии на кнопку.
-            page_button.pack(side='left', pady=4, padx=2)
-            if page_index == 0:
-                page_button.config(foreground="green")
-                self.active_button = page_button
-                # Изменение цвета кнопки при нажатии.
+        previous_button = tk.Button(page_buttons_frame, text='<', command=functools.partial(self.click_page_button,
+                                                                                             step=-1))
+        previous_button.pack(side='left', pady=4, padx=2)
+        self.page_label = tk.Label(page_buttons_frame, text='')
+        self.page_label.pack(side='left', pady=4, padx=2)
+        next_button = tk.Button(page_buttons_frame, text='>', command=functools.partial(self.click_page_button, step=1))
+        next_button.pack(side='left', pady=4, padx=2)
+        # Изменение отображаемого списка объектов при нажатии на кнопку.
         return page_buttons_frame
 
-    def click_page_button(self, page_index, clicked_button):
+    def click_page_button(self, step):
         # Switching pages.
-        current_page = self.pages_list[page_index]
-        self.active_page.pack_forget()
-        current_page.pack()
-        self.active_page = current_page
-        # Changing button colors!
-        clicked_button.config(foreground="green")
-        self.active_button.config(foreground="black")
-        self.active_button = clicked_button
+        page_index = self.page_index + step
+        if 0 <= page_index < self.count_pages():
+            self.show_page(page_index)
 
     def result_processing(self):
-        # Открытие окна с результатами.
-        try:
-            results = self.logic.resume_processing(self.sample_list)
-            self.open_anova_results(results)
-        except Exception:
-             error_text = 'Wrong file'
-             self.open_error_window(error_text)
+        # Открытие окна с результатами. Расчет выполняется в фоновом потоке.
+        ss_type = self.ss_type_names[self.ss_type_var.get()]
+        comparison_type = ComparisonType(self.comparison_var.get())
+        checked_samples = [sample for sample in self.sample_list if sample.is_checked]
+        # Отметки проб фиксируются до запуска потока, чтобы их изменение во время расчета не влияло на результат.
+        self.job_controls.start(lambda job: self.logic.resume_processing(checked_samples, ss_type, comparison_type,
+                                                                         job, self.logic.cache),
+                                self.open_anova_results, self.show_job_error)
+
+    def show_job_error(self, error):
+        error_text = 'Wrong file'
+        self.open_error_window(error_text)
 
     def open_anova_results(self, results):
         result = tk.Tk()
@@ -555,7 +818,9 @@ class Interfacing:
 
         right_frame = tk.Frame(result)
         # Создание рамки в окне с результатами для группировки кнопок.
-        f = functools.partial(self.logic.save_results_to_file, full_list=self.sample_list)
+        f = functools.partial(self.logic.save_results_to_file, full_list=self.sample_list,
+                              ss_type=self.ss_type_names[self.ss_type_var.get()],
+                              comparison_type=ComparisonType(self.comparison_var.get()), cache=self.logic.cache)
         save_button = tk.Button(right_frame, text='Save', command=f)
         save_button.pack(side='bottom', fill='x')
         right_frame.pack(side='right', fill='y', pady=4, padx=2)
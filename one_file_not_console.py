@@ -1,202 +1,367 @@
-import math
+import copy
+import itertools
+import numpy
 import tkinter.filedialog as tk
+from background_jobs import JobControls
+from instrumentation import Trace, traced
+from plate_layout import PlateRegion, WellPositions
+from replicate_groups import ReplicateGroups
+from result_cache import ResultCache
+from sample_ids import SampleIds
+from sample_table import SampleRow, SampleTable, TableFile, TableKind
+from standard_curve import Quantification, QuantificationMode
 
 
-class Sample:
-    # Класс объектов, содержащих достаточные данные (номер строки, номер пробы, концентрация) о пробах в файле.
-    def __init__(self, number_of_raw, number, conc):
-        self.number = number
-        self.conc = conc
-        self.number_of_raw = number_of_raw
+class Sample(SampleRow):
+    # Проба в файле с прибора (номер строки, номер пробы, концентрация) - строка таблицы SampleList.
+    __slots__ = ()
 
     def __repr__(self):
-        return str(self.number_of_raw) + '\t' + self.number + '\t' + self.conc + '\n'
+        return str(self.number_of_raw) + '\t' + self.number + '\t' + str(self.conc) + '\n'
 
 
-class SampleList(list):
-    # Создание списка из объектов, содержащих данные о пробах и их упорядочение.
-    def __init__(self, file: str):
-        super().__init__()
-        file_text = SampleList.load_file(file)
-        # Откртытие файла с прибора.
-        for element in SampleList.parse_file_text(file_text):
-            self.append(element)
-            # Заполнение списка строчками из файла.
+class RawDataBatch:
+    # Пакет строк из файла прибора в виде столбцов: номера строк, номера планшетов, позиции лунок, названия и
+    # концентрации проб, Cp и известные концентрации стандартов (0 у проб).
+    def __init__(self, first_raw, plates, positions, numbers, concs, cps, standards):
+        self.rows = numpy.arange(first_raw, first_raw + len(numbers))
+        self.plates = plates
+        self.positions = positions
+        self.numbers = numbers
+        self.concs = concs
+        self.cps = cps
+        self.standards = standards
 
-    def resume_processing(self, first_raw, last_raw):
-        # Выполнение метода происходит только после нажатия кнопки продолжения работы, после указания необходимых
-        # строчек.
-        meaningful_samples = self.select_meaningful_lines(first_raw, last_raw)
-        self.clear()
-        for element in SampleList.order_samples(meaningful_samples):
-            self.append(element)
-            # Заполнение списка только с теми строчками, в которых находятся даные о пробах.
+    def __len__(self):
+        return len(self.numbers)
 
-    @staticmethod
-    def parse_file_text(file_text):
-        # Разделение строчки на отдельные части и назначение полей класса Sample.
-        i = 0
-        for line in file_text:
-            parts = str.split(line, '\t')
-            # Извлечение названия и значения пробы из каждой строки в кортеж.
-            if parts[0] == 'True':
-                yield Sample(i, parts[3], parts[5] if parts[5] != '' else '0') 
-                i += 1
+    def conc_values(self):
+        # Концентрации в виде массива чисел, переводятся из текста одним вызовом.
+        return numpy.asarray(self.concs, dtype=float)
 
-    @staticmethod
-    def load_file(name_of_file):
-        # Открытие файла и создание списка из строк.
-        file = open(name_of_file)
-        lines = file.readlines()
-        file.close()
-        return lines
+    def cp_values(self):
+        # Cp в виде массива чисел, у лунок без сигнала nan.
+        return numpy.asarray(self.cps, dtype=float)
 
-    def select_meaningful_lines(self, first_raw, last_raw):
-        # Извлечение строк, которые необходимо обработать.
-        start_index = first_raw
-        # Задание номеров строк из интерфейса.
-        end_index = last_raw+1
-        list_for_self = self[start_index:end_index]
-        return list_for_self
+    def standard_values(self):
+        return numpy.asarray(self.standards, dtype=float)
+
+
+class SampleList(SampleTable):
+    # Таблица проб из файла с прибора и их упорядочение.
+    row_class = Sample
+    column_names = SampleTable.column_names + ('cps', 'standards', 'plates', 'well_rows', 'well_columns')
+    batch_size = 4096
+    # Количество строк файла, которое разбирается за один раз.
+
+    @traced('raw data: parse')
+    def __init__(self, file: str):
+        numbers, concs, rows = [], [numpy.empty(0)], [numpy.empty(0, dtype=int)]
+        cps, standards, plates, positions = [numpy.empty(0)], [numpy.empty(0)], [], []
+        for batch in SampleList.read_batches(file):
+            # Файл с прибора читается пакетами, в памяти не хранится весь текст файла. Столбцы сохраняются для всех
+            # лунок: стандарты нужны для кривой, а строки или область выбираются позже, при каждом запуске обработки.
+            numbers += batch.numbers
+            concs.append(batch.conc_values())
+            rows.append(batch.rows)
+            cps.append(batch.cp_values())
+            standards.append(batch.standard_values())
+            plates += batch.plates
+            positions += batch.positions
+        super().__init__(numbers, numpy.concatenate(concs), rows=numpy.concatenate(rows))
+        # Столбцы пакетов объединяются в столбцы таблицы.
+        self.cps = numpy.concatenate(cps)
+        self.standards = numpy.concatenate(standards)
+        self.plates = numpy.asarray(plates, dtype=int)
+        self.well_rows, self.well_columns = WellPositions.arrays(positions)
+        # Номер планшета, ряда и столбца каждой лунки, начиная с нуля.
+        self.curve = None
+        # Стандартные кривые планшетов, если концентрации пересчитаны по ним.
+        Trace.count('raw data: rows', len(numbers))
+
+    def resume_processing(self, first_raw, last_raw, quantification: Quantification = None,
+                          region: PlateRegion = None):
+        # Выполнение метода происходит только после нажатия кнопки продолжения работы, после указания необходимых
+        # строчек или области планшетов. Концентрации пересчитываются по Cp до выбора строк, так как стандарты лежат
+        # вне диапазона проб. Возвращает новую таблицу с выбранными упорядоченными пробами, разобранный файл не
+        # меняется, поэтому его можно обработать повторно с другими параметрами.
+        if region is not None:
+            meaningful_indices = self.select_region(region)
+        else:
+            meaningful_indices = self.select_meaningful_lines(first_raw, last_raw)
+        table = self.quantify(quantification, meaningful_indices) if quantification is not None else self
+        ordered_indices = self.order_samples(meaningful_indices)
+        ordered_samples = table.take(ordered_indices)
+        # В новой таблице остаются только те строчки, в которых находятся даные о пробах.
+        ordered_samples.numbers = self.sample_names(ordered_indices)
+        return ordered_samples
+
+    @traced('raw data: quantification')
+    def quantify(self, quantification: Quantification, sample_indices=None):
+        # Таблица с концентрациями всех лунок по Cp в выбранном режиме. Концентрации считаются из разобранных
+        # столбцов файла, сама таблица не меняется. sample_indices - строки проб, которые будут обработаны.
+        table = copy.copy(self)
+        table.concs, table.curve = quantification.find_concs(self.numbers, self.concs, self.cps, self.standards,
+                                                             self.plates, sample_indices)
+        return table
 
     @staticmethod
-    def remove_nondigits(name):
-        # Удаление из навзваний проб символов, отличных от порядковых номеров.
-        result = tk.re.sub('[^0-9]', '', name)
-        if len(result) > 0:
-            return int(result)
-        return -1
+    def read_batches(name_of_file, batch_size=None):
+        # Построчное чтение файла с прибора и разбор его пакетами.
+        with open(name_of_file) as file:
+            yield from SampleList.parse_batches(file, batch_size or SampleList.batch_size)
 
     @staticmethod
-    def order_samples(list_of_samples):
-        # Сортировка листа объектов по названиям проб.
-        return sorted(list_of_samples, key=lambda sample: (SampleList.remove_nondigits(sample.number)))
+    def parse_batches(file_text, batch_size):
+        # Разделение строчек на столбцы. Нумерация строк сквозная для всех пакетов, учитываются только строки,
+        # в которых Include равно True. В файле может быть записано несколько планшетов подряд, каждый со своей
+        # строкой заголовка Include Color Pos ..., по заголовкам считается номер планшета каждой строки.
+        lines = iter(file_text)
+        i = 0
+        plate = -1
+        while True:
+            chunk = list(itertools.islice(lines, batch_size))
+            if len(chunk) == 0:
+                break
+            parts_list, plates = [], []
+            for parts in (str.split(line, '\t') for line in chunk):
+                if parts[0] == 'True':
+                    parts_list.append(parts)
+                    plates.append(max(plate, 0))
+                elif parts[0] == 'Include':
+                    plate += 1
+            # Извлечение позиции, названия и значения пробы из каждой строки.
+            if len(parts_list) > 0:
+                yield RawDataBatch(i, plates, [parts[2] for parts in parts_list], [parts[3] for parts in parts_list],
+                                   [parts[5] if parts[5] != '' else '0' for parts in parts_list],
+                                   [parts[4] if parts[4] != '' else 'nan' for parts in parts_list],
+                                   [parts[6] if len(parts) > 6 and parts[6].strip() != '' else '0'
+                                    for parts in parts_list])
+                # В экспорте без столбца Standard все лунки считаются пробами.
+                i += len(parts_list)
+
+    def select_meaningful_lines(self, first_raw, last_raw):
+        # Номера строк таблицы, которые необходимо обработать. Номера строк задаются из интерфейса.
+        return numpy.arange(len(self))[first_raw:last_raw + 1]
+
+    def select_region(self, region: PlateRegion):
+        # Номера строк таблицы, лунки которых лежат в области планшетов, в порядке файла.
+        return numpy.flatnonzero(region.select(self.plates, self.well_rows, self.well_columns))
+
+    def sample_names(self, indices):
+        # Названия проб в указанных строках. Если проба с одним названием встречается на нескольких планшетах, к ее
+        # названиям без номера планшета добавляется номер планшета в файле, чтобы такие пробы не считались повторами
+        # одной пробы. Остальные названия не меняются и сопоставляются с файлом групп по номеру.
+        names = self.numbers[indices]
+        plates = self.plates[indices]
+        if len(numpy.unique(plates)) < 2:
+            return names
+        keys, inverse = SampleIds.replicate_keys(names)
+        index = {}
+        key_of = numpy.array([index.setdefault(key, len(index)) for key in keys], dtype=int)[inverse]
+        key_plates = numpy.unique(numpy.stack((key_of, plates)), axis=1)
+        is_shared = numpy.bincount(key_plates[0], minlength=len(index))[key_of] > 1
+        # Пробы, лунки которых лежат больше чем на одном планшете.
+        if not is_shared.any():
+            return names
+        return numpy.array([SampleIds.with_plate(name, plate + 1) if shared else name
+                            for name, plate, shared in zip(names.tolist(), plates.tolist(), is_shared.tolist())])
+
+    @traced('raw data: order samples')
+    def order_samples(self, indices):
+        # Сортировка номеров строк по планшету и номеру пробы из названия. Сортировка устойчивая, повторы одной пробы
+        # остаются в порядке файла.
+        return indices[SampleIds.sort_order(self.sample_names(indices))]
 
 
 class StatisticsSamples:
-    # создание списка упорядоченных объектов
-    def __init__(self, number, conc1, conc2, aver, perc, com):
+    # создание списка упорядоченных объектов. concs - концентрации повторов, недостающие повторы - пустые строки.
+    def __init__(self, number, concs, aver, perc, com):
         self.number = number
-        self.conc1 = conc1
-        self.conc2 = conc2
+        self.concs = concs
         self.aver = aver
         self.perc = perc
         self.com = com
 
+    @property
+    def conc1(self):
+        return self.concs[0]
+
+    @property
+    def conc2(self):
+        return self.concs[1]
+
     def __repr__(self):
-        return self.number + '\t' + str(self.conc1) + '\t' + str(self.conc2) + '\t' + str(self.aver) + '\t'\
-               + str(self.perc) + '\t' + self.com + '\n'
+        return self.number + '\t' + '\t'.join(str(conc) for conc in self.concs) + '\t' + str(self.aver) + '\t' + \
+            str(self.perc) + '\t' + self.com + '\n'
 
 
 class ListOfStatisticsSamples(list):
     # Подготовка списка к статистической обработке.
-    def __init__(self, source_samples: SampleList, quantity: int):
-        # Спаривание строчек со значениями концентраций для одной пробы.
+    @traced('raw data: replicate aggregation')
+    def __init__(self, source_samples: SampleTable, quantity: int):
+        # Объединение строчек со значениями концентраций для одной пробы. Повторы находятся по названию пробы, их
+        # может быть любое количество. Для дубликатов результат совпадает с прежним спариванием соседних строк.
         super().__init__()
-        for i in range(0, len(source_samples)-1, 2):
-            element = source_samples[i]
-            element2 = source_samples[i+1]
-            self.append(StatisticsSamples(element.number, float(element.conc), float(element2.conc), 0, 0, []))
-
-            ListOfStatisticsSamples.calculate_average(self, quantity)
-            ListOfStatisticsSamples.calculate_percent(self)
-            ListOfStatisticsSamples.generate_comments(self)
-            # Заполнение остальных полей класса, величина quantity задаётся из интерфейса и является величиной проб,
-            # взятых в анализ в мкл.
+        groups = ReplicateGroups(source_samples.numbers, source_samples.concs)
+        self.width = max(2, int(groups.counts.max()) if len(groups) > 0 else 0)
+        # Количество столбцов концентраций повторов, не меньше двух.
+        matrix = groups.replicate_matrix(self.width)
+        average_values = ListOfStatisticsSamples.calculate_average(groups, quantity)
+        averages = [round(aver, 2) for aver in average_values.tolist()]
+        percent_values, has_percent = ListOfStatisticsSamples.calculate_percent(groups)
+        percents = [round(perc, 1) if with_perc else 0
+                    for perc, with_perc in zip(percent_values.tolist(), has_percent.tolist())]
+        # Округление выполняется встроенным round, чтобы результат совпадал с прежним построчным расчетом.
+        comments = ListOfStatisticsSamples.generate_comments(groups, numpy.array(percents, dtype=float))
+        # Величина quantity задаётся из интерфейса и является величиной проб, взятых в анализ в мкл.
+        numbers = source_samples.numbers[groups.first_wells]
+        concs = [[conc if conc == conc else '' for conc in row] for row in matrix.tolist()]
+        for number, replicate_concs, aver, perc, com in zip(numbers.tolist(), concs, averages, percents, comments):
+            self.append(StatisticsSamples(number, replicate_concs, aver, perc, com))
+        self.columns = {'number': numbers}
+        self.columns.update({'conc' + str(i + 1): matrix[:, i] for i in range(self.width)})
+        self.columns.update({'aver': average_values, 'perc': percent_values, 'comment': comments,
+                             'count': groups.counts, 'cv': groups.find_cv(), 'range': groups.find_ranges()})
+        # Столбцы без округления для двоичной таблицы.
+
+    def header(self):
+        return 'number\t' + ''.join('conc' + str(i + 1) + '\t' for i in range(self.width)) + \
+            'aver\tperc\tprecision\taccuracy\tzero'
 
     @staticmethod
-    def calculate_average(collected_samples, quantity: int):
+    def calculate_average(groups: ReplicateGroups, quantity: int):
         # Для вычисления среднего необходимо задать количество микролитров пробы.
-        quan = quantity
-        for element in collected_samples:
-            element.aver = round(((element.conc1 + element.conc2)/2)/quan, 2)
+        return groups.find_means() / quantity
 
     @staticmethod
-    def calculate_percent(collected_samples):
-        # Рассчет процента отличия первой концентрации пробы от второй (сравнение двух повторов).
-        for element in collected_samples:
-            if element.conc1 != 0 and element.conc2 != 0:
-                # Если одна из концетраций равна нулю, то такая проба отмечается в методе "создать коммертарий" как
-                # плохая.
-                bigger = max([element.conc1, element.conc2])
-                element.perc = round(((math.fabs(element.conc1-element.conc2))/bigger*100), 1)
+    def calculate_percent(groups: ReplicateGroups):
+        # Рассчет процента отличия наименьшей концентрации повторов от наибольшей (для двух повторов - отличие первой
+        # концентрации от второй).
+        has_percent = (groups.counts >= 2) & (ListOfStatisticsSamples.count_zeros(groups) == 0)
+        # Если одна из концетраций равна нулю, то такая проба отмечается в методе "создать коммертарий" как плохая.
+        bigger = numpy.where(has_percent, groups.reduce(numpy.maximum), 1)
+        percents = numpy.where(has_percent, groups.find_ranges() / bigger * 100, 0)
+        return percents, has_percent
 
     @staticmethod
-    def generate_comments(collected_samples):
-        for element in collected_samples:
-            comments = []
-
-            def calculate_precision():
-                # Если процент различия концентраций проб больше 30, то проба плохая.
-                precision = ''
-                if element.perc > 30:
-                    precision = 'bad'
-                return precision
-
-            def calculate_accuracy():
-                # Если концентрация меньше определнной величины, то в пробе нет гена и есть только грязь.
-                accuracy = ''
-                if element.conc1 < 0.01 or element.conc2 < 0.01:
-                    accuracy = 'bad'
-                return accuracy
-
-            def calculate_zero_result():
-                # Если одна из концентраций ноль, то этт выпадающее значение.
-                zero_result = ''
-                if element.conc1 == 0 or element.conc2 == 0:
-                    zero_result = 'exist'
-                return zero_result
-
-            comments.append(calculate_precision())
-            comments.append(calculate_accuracy())
-            comments.append(calculate_zero_result())
-            element.com = '\t'.join(comments)
-            # Комментарии заполняют список, который потом становится значением поля класса StatisticSamoles.
+    def count_zeros(groups: ReplicateGroups):
+        return groups.reduce(numpy.add, (groups.concs == 0).astype(int))
+
+    @staticmethod
+    def generate_comments(groups: ReplicateGroups, percents):
+        # Если процент различия концентраций проб больше 30, то проба плохая.
+        precision = numpy.where(percents > 30, 'bad', '')
+        # Если концентрация меньше определнной величины, то в пробе нет гена и есть только грязь.
+        accuracy = numpy.where(groups.reduce(numpy.minimum) < 0.01, 'bad', '')
+        # Если одна из концентраций ноль, то этт выпадающее значение.
+        zero_result = numpy.where(ListOfStatisticsSamples.count_zeros(groups) > 0, 'exist', '')
+        return ['\t'.join(comments) for comments in zip(precision.tolist(), accuracy.tolist(), zero_result.tolist())]
+        # Комментарии становятся значением поля класса StatisticSamoles.
 
 
 class LogicLayer:
     # Создание логической части интерфейса,
+    def __init__(self, cache: ResultCache = None):
+        self.cache = cache
+        # Кэш результатов на диске. Если кэш не задан, то файл разбирается и обрабатывается заново при каждом запуске.
 
     def open_work_file(self):
         # Метод кнопки открытия файла, возвращает набор строчек и полное имя файла.
         open_path = tk.askopenfilename()
         file_name = open_path
-        self.samples = SampleList(file_name)
+        return self.load_work_file(file_name), file_name
+
+    @traced('raw data: load file')
+    def load_work_file(self, file_name):
+        # Чтение файла с прибора по известному пути, возвращает набор строчек.
+        self.file_name = file_name
+        if self.cache is not None:
+            self.file_hash = self.cache.file_hash(file_name)
+            self.samples = self.cache.get_or_compute(ResultCache.key('raw data', self.file_hash),
+                                                     lambda: SampleList(file_name))
+        else:
+            self.samples = SampleList(file_name)
         result = ''
         for sample in self.samples:
             result += sample.__repr__()
-        return result, file_name
+        return result
 
-    def resume_processing(self, first_raw, last_raw, quantity):
+    def resume_processing(self, first_raw, last_raw, quantity, job=None, quantification: Quantification = None,
+                          region: PlateRegion = None):
         # Метод продолжения работы после указания рабочих строк, количества проб, возвращает обработанные упорядоченные
-        # пробы.
-        self.samples.resume_processing(first_raw, last_raw)
-        self.tempsamples = ListOfStatisticsSamples(self.samples, quantity)
+        # пробы. Если метод выполняется в фоновой задаче job, то он сообщает ей о ходе работы. Без параметров
+        # quantification используются концентрации прибора. Если задана область планшетов region, то пробы
+        # выбираются по ней, а не по номерам строк.
+        self.first_raw, self.last_raw, self.quantity = first_raw, last_raw, quantity
+        self.quantification = quantification or Quantification()
+        self.region = region
+        if self.cache is not None:
+            key = ResultCache.key('ordered results', self.file_hash, first_raw, last_raw, quantity,
+                                  *self.quantification.key(), repr(region))
+            self.tempsamples = self.cache.get_or_compute(key, lambda: self.process_samples(job))
+        else:
+            self.tempsamples = self.process_samples(job)
+        self.curve = self.tempsamples.curve
         result = ''
         for sample in self.tempsamples:
             result += sample.__repr__()
         return result
 
+    def process_samples(self, job=None):
+        # Упорядочение проб и усреднение повторов.
+        if job is not None:
+            job.report_progress('Ordering samples')
+        ordered_samples = self.samples.resume_processing(self.first_raw, self.last_raw, self.quantification,
+                                                         self.region)
+        if job is not None:
+            job.report_progress('Averaging replicates')
+        tempsamples = ListOfStatisticsSamples(ordered_samples, self.quantity)
+        tempsamples.curve = ordered_samples.curve
+        # Стандартная кривая хранится вместе с результатом, чтобы ее можно было показать и при чтении из кэша.
+        return tempsamples
+
     def save_results_to_file(self):
         # Метод сохранения результата в текстовый файл построчно.
-        save_path = tk.asksaveasfilename(filetypes=[('text files', '.txt'), ('all files', '.*')],
-                                         initialfile='ordered_results.txt')
+        save_path = tk.asksaveasfilename(filetypes=[('text files', '.txt'), ('binary tables', '.npz'),
+                                                    ('all files', '.*')], initialfile='ordered_results.txt')
+        self.write_results(save_path)
+        print(self.tempsamples.header())
+        for sample in self.tempsamples:
+            print(sample)
+
+    @traced('raw data: write results')
+    def write_results(self, save_path):
+        # Запись результата в текстовый файл по известному пути. Если путь оканчивается на .npz, то результат
+        # записывается двоичной таблицей для раздела Create full list.
+        if save_path.endswith(TableFile.extension):
+            self.write_binary(save_path)
+            return
         file = open(save_path, 'w')
-        file.write('number' + '\t' + 'conc1' + '\t' + 'conc2' + '\t' + 'aver' + '\t' + 'perc' + '\t' + 'precision' +
-                   '\t' + 'accuracy' + '\t' + 'zero' + '\n')
-        print('number' + '\t' + 'conc1' + '\t' + 'conc2' + '\t' + 'aver' + '\t' + 'perc' + '\t' + 'precision' + '\t' +
-              'accuracy' + '\t' + 'zero')
+        file.write(self.tempsamples.header() + '\n')
         for sample in self.tempsamples:
             file.write(str(sample))
-            print(sample)
         file.close()
 
+    def write_binary(self, save_path):
+        parameters = {'first raw': self.first_raw, 'last raw': self.last_raw, 'quantity': self.quantity,
+                      'quantification': self.quantification.mode.value}
+        if self.region is not None:
+            parameters['region'] = repr(self.region)
+        if self.quantification.mode == QuantificationMode.delta_delta_ct:
+            parameters.update({'calibrator': self.quantification.calibrator,
+                               'efficiency': self.quantification.efficiency})
+        if self.curve is not None:
+            parameters.update(self.curve.parameters())
+        provenance = TableFile.provenance('Processing raw data', [self.file_name], parameters)
+        TableFile.write(save_path, TableKind.ordered_results, self.tempsamples.columns, provenance)
+
 
 class Interfacing:
     # Класс для графического отображения интерфейса.
 
     def __init__(self):
-        self.logic = LogicLayer()
+        self.logic = LogicLayer(ResultCache())
         root = tk.Tk()
         root.title('Processing raw data')
         # Создание основного окна.
@@ -210,9 +375,25 @@ class Interfacing:
         texts_frame = self.create_text_elements_frame(right_frame)
         texts_frame.pack(side="top", pady=10)
         # Рамка в правой рамке окна для полей с номерами строк и размера проб.
+        tk.Label(right_frame, text='Concentrations').pack(side='top', fill='x')
+        self.quantification_var = tk.StringVar(root, value=QuantificationMode.instrument.value)
+        tk.OptionMenu(right_frame, self.quantification_var, *[item.value for item in QuantificationMode]).pack(
+            side='top', fill='x')
+        # Выбор способа расчета концентраций: значения прибора, стандартная кривая или ddCt.
+        tk.Label(right_frame, text='Calibrator').pack(side='top', fill='x')
+        self.calibrator_tb = tk.Entry(right_frame, width=8)
+        self.calibrator_tb.pack(side='top')
+        # Название пробы-калибратора для ddCt, без названия калибратором служит среднее всех проб.
         self.resume_button = tk.Button(right_frame, text='Resume', command=self.resume_processing)
         self.resume_button.pack(side='top', fill='x')
 
+        self.job_controls = JobControls(right_frame)
+        self.job_controls.pack(side='top', fill='x', pady=10)
+        # Строка состояния и кнопка отмены для обработки в фоновом потоке.
+        self.curve_text = tk.Label(right_frame, text='', justify='left', wraplength=160)
+        self.curve_text.pack(side='top', fill='x')
+        # Параметры стандартной кривой, если концентрации пересчитаны по ней.
+
         self.save_button = tk.Button(right_frame, text='Save', command=self.logic.save_results_to_file)
         self.save_button.pack(side='bottom', fill='x')
         right_frame.pack(side='right', fill='y', pady=4, padx=2)
@@ -252,21 +433,52 @@ class Interfacing:
 
     def resume_processing(self):
         # Результат работы кнопки "Resume".
-        # В текстовом поле выводится результат обработки проб.
-        if self.first_raw_tb.get() != '' and self.last_raw_tb.get() != '' and self.quantity_tb.get() != '' and \
-                        float(self.quantity_tb.get()) > 0 and int(self.first_raw_tb.get())>= 0 and \
-                        int(self.first_raw_tb.get()) < 97 and int(self.last_raw_tb.get()) < 97 and \
-                        int(self.last_raw_tb.get()) > int(self.first_raw_tb.get()):
-            text = self.logic.resume_processing(int(self.first_raw_tb.get()), int(self.last_raw_tb.get()),
-                                                float(self.quantity_tb.get()))
-            self.list_of_sam_in_ob_box.delete(1.0, tk.END)
-            self.list_of_sam_in_ob_box.insert(tk.END, text)
-            self.list_of_sam_in_ob_box.config(state=tk.DISABLED)
+        # В текстовом поле выводится результат обработки проб. Пробы выбираются по области планшетов, если она
+        # указана, иначе по номерам строк. Количество строк не ограничено, файл может содержать несколько планшетов
+        # на 96 или 384 лунки.
+        try:
+            region = PlateRegion.parse(self.region_tb.get()) if self.region_tb.get().strip() != '' else None
+        except ValueError as error:
+            self.open_error_window(str(error))
+            return
+        if region is not None:
+            is_range_correct = True
+            first_raw, last_raw = -1, -1
+        else:
+            is_range_correct = self.first_raw_tb.get() != '' and self.last_raw_tb.get() != '' and \
+                int(self.first_raw_tb.get()) >= 0 and int(self.last_raw_tb.get()) > int(self.first_raw_tb.get())
+            first_raw = int(self.first_raw_tb.get()) if is_range_correct else -1
+            last_raw = int(self.last_raw_tb.get()) if is_range_correct else -1
+        if is_range_correct and self.quantity_tb.get() != '' and float(self.quantity_tb.get()) > 0:
+            quantity = float(self.quantity_tb.get())
+            quantification = Quantification(QuantificationMode(self.quantification_var.get()),
+                                            self.calibrator_tb.get().strip() or None)
+            self.job_controls.start(lambda job: self.logic.resume_processing(first_raw, last_raw, quantity, job,
+                                                                             quantification, region),
+                                    self.show_results, self.show_job_error)
+            # Обработка выполняется в фоновом потоке, результат выводится после ее завершения.
         else:
             error_text = 'Wrong row range'
             self.open_error_window(error_text)
-        self.header_text['text'] = 'number      conc1         conc2         aver         perc         precision      ' \
-                                   'accuracy      zero'
+
+    def show_results(self, text):
+        # В текстовом поле выводится результат обработки проб.
+        self.list_of_sam_in_ob_box.delete(1.0, tk.END)
+        self.list_of_sam_in_ob_box.insert(tk.END, text)
+        self.list_of_sam_in_ob_box.config(state=tk.DISABLED)
+        self.header_text['text'] = Interfacing.header_label(self.logic.tempsamples.width)
+        self.curve_text['text'] = str(self.logic.curve) if self.logic.curve is not None else ''
+
+    @staticmethod
+    def header_label(width):
+        # Заголовок над результатом: по столбцу conc на каждый повтор, как в записываемом файле. Названия столбцов
+        # дополняются пробелами, чтобы стоять над значениями.
+        return 'number'.ljust(12) + ''.join(('conc' + str(i + 1)).ljust(14) for i in range(width)) + \
+            'aver'.ljust(13) + 'perc'.ljust(13) + 'precision'.ljust(15) + 'accuracy'.ljust(14) + 'zero'
+
+    def show_job_error(self, error):
+        error_text = 'Wrong file\n' + str(error)
+        self.open_error_window(error_text)
 
     def create_text_elements_frame(self, right_frame):
         # Создание рамки в правой рамке окна для полей с номерами строк и размера проб.
@@ -274,14 +486,18 @@ class Interfacing:
         tk.Label(texts_frame, text="First raw").grid(column=0, row=0, padx=2, pady=2)
         tk.Label(texts_frame, text="Last raw").grid(column=0, row=1, padx=2, pady=2)
         tk.Label(texts_frame, text="Quantity").grid(column=0, row=2, padx=2, pady=2)
+        tk.Label(texts_frame, text="Region").grid(column=0, row=3, padx=2, pady=2)
 
         self.first_raw_tb = tk.Entry(texts_frame, width=4)
         self.last_raw_tb = tk.Entry(texts_frame, width=4)
         self.quantity_tb = tk.Entry(texts_frame, width=4)
+        self.region_tb = tk.Entry(texts_frame, width=10)
+        # Область планшетов вместо номеров строк, например B1-H12 или 1-3:B1-P24.
 
         self.first_raw_tb.grid(column=1, row=0)
         self.last_raw_tb.grid(column=1, row=1)
         self.quantity_tb.grid(column=1, row=2)
+        self.region_tb.grid(column=1, row=3)
         return texts_frame
 
     def open_error_window(self, error_text):
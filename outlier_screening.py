@@ -0,0 +1,113 @@
+import functools
+import numpy
+import scipy.stats
+from enum import IntFlag
+
+
+class OutlierFlag(IntFlag):
+    # Критерии, по которым проба отмечена как выпадающая. Проба может быть отмечена несколькими критериями сразу.
+    none = 0
+    dixon = 1
+    grubbs = 2
+    modified_z = 4
+
+
+class OutlierScreening:
+    # Поиск выпадающих значений сразу во всех группах. Концентрации всех групп лежат одним массивом, внутри каждой
+    # группы они упорядочены по возрастанию, группа задается смещением начала и количеством проб. Все расчеты идут
+    # над общим массивом без циклов по группам.
+    alpha = 0.05
+    dixon_critical_values = {3: 0.970, 4: 0.829, 5: 0.710, 6: 0.625, 7: 0.568, 8: 0.526, 9: 0.493, 10: 0.466}
+    # Критические значения Q-критерия Диксона (r10) для уровня значимости 0.05. Для групп больше 10 проб критерий не
+    # применяется.
+    modified_z_limit = 3.5
+    # Граница модифицированного z (Iglewicz, Hoaglin).
+
+    def __init__(self, concs, offsets, counts):
+        self.concs = numpy.asarray(concs, dtype=float)
+        self.offsets = numpy.asarray(offsets, dtype=int)
+        self.counts = numpy.asarray(counts, dtype=int)
+        self.group_of = numpy.repeat(numpy.arange(len(self.counts)), self.counts)
+        self.sizes = self.counts[self.group_of]
+        self.positions = numpy.arange(len(self.concs)) - self.offsets[self.group_of]
+        # Для каждой пробы: номер группы, размер группы и место пробы в группе.
+
+    def at(self, indices):
+        # Концентрации по номерам в общем массиве, номера за пределами массива заменяются крайними.
+        return self.concs[numpy.clip(indices, 0, max(len(self.concs) - 1, 0))]
+
+    def find_comment_ratios(self):
+        # Отношения, которые программа показывает в комментариях: для трех первых проб группы
+        # (x[a+1] - x[a]) / (x[-2] - x[a]), для трех последних (x[b] - x[b-1]) / (x[b] - x[2]). Если одна проба
+        # попадает в обе тройки, то используется отношение для последних проб. Для групп меньше четырех проб отношения
+        # не определены. Где отношение не считается, стоит nan.
+        index = numpy.arange(len(self.concs))
+        base = self.offsets[self.group_of]
+        is_large = self.sizes >= 4
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            first_penult = self.at(base + self.sizes - 2)
+            is_low = is_large & (self.positions < 3) & (first_penult > self.concs)
+            low = (self.at(index + 1) - self.concs) / (first_penult - self.concs)
+            second = self.at(base + 2)
+            is_high = is_large & (self.positions >= self.sizes - 3) & (self.concs > second)
+            high = (self.concs - self.at(index - 1)) / (self.concs - second)
+        return numpy.where(is_high, high, numpy.where(is_low, low, numpy.nan))
+
+    def find_dixon_flags(self):
+        # Q-критерий Диксона для наименьшей и наибольшей пробы каждой группы из 3-10 проб.
+        first = self.concs[self.offsets]
+        last = self.concs[self.offsets + self.counts - 1]
+        critical = numpy.array([OutlierScreening.dixon_critical_values.get(n, numpy.inf) for n in self.counts.tolist()])
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            value_range = last - first
+            q_low = (self.at(self.offsets + 1) - first) / value_range
+            q_high = (last - self.at(self.offsets + self.counts - 2)) / value_range
+        flags = numpy.zeros(len(self.concs), dtype=bool)
+        is_defined = (self.counts >= 3) & (value_range > 0)
+        flags[self.offsets[is_defined & (q_low > critical)]] = True
+        flags[(self.offsets + self.counts - 1)[is_defined & (q_high > critical)]] = True
+        return flags
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def grubbs_critical_values(max_size):
+        # Таблица критических значений двустороннего критерия Граббса для групп от 0 до max_size проб. Для групп
+        # меньше трех проб критерий не применяется (inf).
+        sizes = numpy.arange(3, max_size + 1)
+        t = scipy.stats.t.isf(OutlierScreening.alpha / (2 * sizes), sizes - 2)
+        values = (sizes - 1) / numpy.sqrt(sizes) * numpy.sqrt(t ** 2 / (sizes - 2 + t ** 2))
+        return numpy.concatenate((numpy.full(3, numpy.inf), values))
+
+    def find_grubbs(self):
+        # Статистика Граббса для каждой пробы: отклонение от среднего группы в несмещенных стандартных отклонениях.
+        means = numpy.add.reduceat(self.concs, self.offsets) / self.counts
+        deviations = self.concs - means[self.group_of]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            deviations_sd = numpy.sqrt(numpy.add.reduceat(deviations ** 2, self.offsets) / (self.counts - 1))
+            return numpy.abs(deviations) / deviations_sd[self.group_of]
+
+    def find_medians(self, values):
+        # Медианы групп для значений, упорядоченных по возрастанию внутри каждой группы.
+        return (values[self.offsets + (self.counts - 1) // 2] + values[self.offsets + self.counts // 2]) / 2
+
+    def find_modified_z(self):
+        # Модифицированный z: 0.6745 * (x - медиана) / MAD, где MAD - медиана абсолютных отклонений от медианы.
+        medians = self.find_medians(self.concs)
+        deviations = numpy.abs(self.concs - medians[self.group_of])
+        order = numpy.lexsort((deviations, self.group_of))
+        mad = self.find_medians(deviations[order])
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            return 0.6745 * (self.concs - medians[self.group_of]) / mad[self.group_of]
+
+    def find_flags(self):
+        # Отметки выпадающих проб по всем критериям. Для групп меньше трех проб и групп без разброса значений
+        # отметок нет.
+        if len(self.concs) == 0:
+            return numpy.zeros(0, dtype=numpy.uint8)
+        critical = OutlierScreening.grubbs_critical_values(int(self.counts.max()))[self.sizes]
+        with numpy.errstate(invalid='ignore'):
+            is_grubbs = self.find_grubbs() > critical
+            is_modified_z = (self.sizes >= 3) & (numpy.abs(self.find_modified_z()) > OutlierScreening.modified_z_limit)
+        flags = self.find_dixon_flags() * int(OutlierFlag.dixon) + is_grubbs * int(OutlierFlag.grubbs) + \
+            is_modified_z * int(OutlierFlag.modified_z)
+        return flags.astype(numpy.uint8)
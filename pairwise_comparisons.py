@@ -0,0 +1,86 @@
+import numpy
+import scipy.stats
+from enum import Enum
+
+
+class ComparisonType(Enum):
+    # Способы попарного сравнения групп. Fisher - сравнение каждой пары групп без поправки на множественность, как в
+    # прежних версиях программы, Bonferroni и Holm - те же сравнения с поправкой, Tukey HSD - по общей внутригрупповой
+    # дисперсии всех групп.
+    fisher = 'Fisher'
+    tukey = 'Tukey HSD'
+    bonferroni = 'Bonferroni'
+    holm = 'Holm'
+
+
+class PairwiseComparisons:
+    # Сравнение всех пар групп по количеству проб, среднему и сумме квадратов отклонений от среднего каждой группы.
+    # Каждая пара (i, j), где i < j, считается один раз, расчет идет сразу по всем парам. Средние и суммы квадратов
+    # могут быть матрицами группа x ген, тогда пары сравниваются сразу для всех генов. Дисперсии объединяются через
+    # суммы квадратов, поэтому группа из одной пробы (сумма квадратов 0) не делает общую дисперсию неопределенной.
+    def __init__(self, counts, means, sums_of_squares):
+        self.means = numpy.asarray(means, dtype=float)
+        self.sums_of_squares = numpy.asarray(sums_of_squares, dtype=float)
+        self.counts = numpy.asarray(counts, dtype=float).reshape((-1,) + (1,) * (self.means.ndim - 1))
+        self.first, self.second = numpy.triu_indices(len(self.counts), k=1)
+
+    def find_fisher_p(self):
+        # Однофакторный анализ для двух групп: F равно квадрату t-критерия с объединенной дисперсией пары групп.
+        n1 = self.counts[self.first]
+        n2 = self.counts[self.second]
+        df = n1 + n2 - 2
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            pooled_variance = (self.sums_of_squares[self.first] + self.sums_of_squares[self.second]) / df
+            f = (self.means[self.first] - self.means[self.second]) ** 2 / (pooled_variance * (1 / n1 + 1 / n2))
+        return scipy.stats.f.sf(f, 1, df)
+
+    def find_tukey_p(self):
+        # Критерий Тьюки (для неравных групп - Тьюки-Крамера) по внутригрупповой дисперсии всех групп.
+        error_df = numpy.sum(self.counts) - len(self.counts)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            error_ms = numpy.sum(self.sums_of_squares, axis=0) / error_df
+            q = numpy.abs(self.means[self.first] - self.means[self.second]) / \
+                numpy.sqrt(error_ms / 2 * (1 / self.counts[self.first] + 1 / self.counts[self.second]))
+        return scipy.stats.studentized_range.sf(q, len(self.counts), error_df)
+
+    @staticmethod
+    def count_comparisons(p_values):
+        # Количество сравнений для поправки на множественность. Сравнения с неопределенным p (nan - нулевая дисперсия
+        # пары групп) не учитываются и после поправки остаются nan. Для матрицы количество считается по столбцам.
+        return numpy.sum(numpy.isfinite(p_values), axis=0)
+
+    @staticmethod
+    def adjust_bonferroni(p_values):
+        return numpy.minimum(p_values * PairwiseComparisons.count_comparisons(p_values), 1)
+
+    @staticmethod
+    def adjust_holm(p_values):
+        # Пошаговая поправка Холма: наименьшее p умножается на количество сравнений, следующее - на количество
+        # сравнений без одного и так далее, с сохранением порядка p-значений. Для матрицы поправка идет по столбцам.
+        # При сортировке nan стоят после всех p, поэтому на поправку остальных не влияют.
+        order = numpy.argsort(p_values, axis=0)
+        ranks = numpy.arange(len(p_values)).reshape((-1,) + (1,) * (p_values.ndim - 1))
+        multipliers = PairwiseComparisons.count_comparisons(p_values) - ranks
+        sorted_p = numpy.take_along_axis(p_values, order, axis=0)
+        adjusted = numpy.minimum(numpy.maximum.accumulate(sorted_p * multipliers, axis=0), 1)
+        result = numpy.empty_like(adjusted)
+        numpy.put_along_axis(result, order, adjusted, axis=0)
+        return result
+
+    def find_p_values(self, comparison_type: ComparisonType):
+        # p для каждой пары групп из верхнего треугольника матрицы.
+        if comparison_type == ComparisonType.tukey:
+            return self.find_tukey_p()
+        p_values = self.find_fisher_p()
+        if comparison_type == ComparisonType.bonferroni:
+            return PairwiseComparisons.adjust_bonferroni(p_values)
+        if comparison_type == ComparisonType.holm:
+            return PairwiseComparisons.adjust_holm(p_values)
+        return p_values
+
+    def to_matrix(self, p_values):
+        # Симметричная матрица p для всех групп, на диагонали nan.
+        matrix = numpy.full((len(self.counts), len(self.counts)) + p_values.shape[1:], numpy.nan)
+        matrix[self.first, self.second] = p_values
+        matrix[self.second, self.first] = p_values
+        return matrix
@@ -0,0 +1,109 @@
+import functools
+import re
+import numpy
+from enum import Enum
+
+
+class PlateFormat(Enum):
+    # Форматы планшетов: количество рядов (буквы A, B, ...) и столбцов.
+    wells_96 = (8, 12)
+    wells_384 = (16, 24)
+
+    @staticmethod
+    def from_wells(wells: int):
+        for plate_format in PlateFormat:
+            rows, columns = plate_format.value
+            if rows * columns == wells:
+                return plate_format
+        raise ValueError('Unsupported plate size ' + str(wells))
+
+    def positions(self):
+        # Позиции лунок в порядке экспорта прибора: A1, A2, ..., затем следующий ряд.
+        rows, columns = self.value
+        return [WellPositions.row_name(row) + str(column + 1) for row in range(rows) for column in range(columns)]
+
+
+class WellPositions:
+    # Разбор позиций лунок (столбец Pos: A1, H12, P24) на номер ряда и номер столбца, начиная с нуля. Ряды после Z
+    # называются AA, AB, ... Позиций на планшете немного, каждая разбирается один раз.
+    pattern = re.compile(r'\s*([A-Za-z]+)\s*(\d+)\s*')
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def parse(position: str):
+        # Номер ряда и столбца. Для позиции, которая не является позицией лунки, возвращается (-1, -1).
+        match = WellPositions.pattern.fullmatch(position)
+        if match is None:
+            return -1, -1
+        letters, column = match.groups()
+        row = 0
+        for letter in letters.upper():
+            row = row * 26 + ord(letter) - ord('A') + 1
+        return row - 1, int(column) - 1
+
+    @staticmethod
+    def row_name(row: int):
+        name = ''
+        row += 1
+        while row > 0:
+            row, letter = divmod(row - 1, 26)
+            name = chr(ord('A') + letter) + name
+        return name
+
+    @staticmethod
+    def arrays(positions):
+        # Массивы номеров рядов и столбцов для всех лунок.
+        if len(positions) == 0:
+            return numpy.zeros(0, dtype=int), numpy.zeros(0, dtype=int)
+        unique_positions, inverse = numpy.unique(numpy.asarray(positions, dtype=str), return_inverse=True)
+        parsed = numpy.array([WellPositions.parse(position) for position in unique_positions.tolist()], dtype=int)
+        inverse = inverse.reshape(-1)
+        return parsed[inverse, 0], parsed[inverse, 1]
+
+
+class PlateRegion:
+    # Прямоугольная область лунок на одном или нескольких планшетах, например B1-H12 (на всех планшетах),
+    # 2:A1-P24 (второй планшет) или 1-3:B1-G11. Планшеты нумеруются с единицы в порядке записи в файле.
+    pattern = re.compile(r'\s*(?:(\d+)\s*(?:-\s*(\d+))?\s*:)?\s*([A-Za-z]+\s*\d+)\s*(?:-\s*([A-Za-z]+\s*\d+))?\s*')
+
+    def __init__(self, first_plate, last_plate, first_row, last_row, first_column, last_column):
+        self.first_plate = first_plate
+        self.last_plate = last_plate
+        # None - все планшеты файла.
+        self.first_row = first_row
+        self.last_row = last_row
+        self.first_column = first_column
+        self.last_column = last_column
+
+    @staticmethod
+    def parse(text: str):
+        match = PlateRegion.pattern.fullmatch(text)
+        if match is None:
+            raise ValueError('Wrong plate region ' + text)
+        first_plate, last_plate, first_well, last_well = match.groups()
+        first_row, first_column = WellPositions.parse(first_well)
+        last_row, last_column = WellPositions.parse(last_well if last_well is not None else first_well)
+        if first_plate is not None:
+            first_plate = int(first_plate)
+            last_plate = int(last_plate) if last_plate is not None else first_plate
+            if first_plate < 1 or last_plate < first_plate:
+                raise ValueError('Wrong plates in region ' + text)
+        if first_row > last_row or first_column > last_column or first_column < 0:
+            raise ValueError('Wrong wells in region ' + text)
+        return PlateRegion(first_plate, last_plate, first_row, last_row, first_column, last_column)
+
+    def select(self, plates, rows, columns):
+        # Отметки лунок, которые попадают в область. plates - номера планшетов лунок, начиная с нуля.
+        is_selected = (rows >= self.first_row) & (rows <= self.last_row) & (columns >= self.first_column) & \
+            (columns <= self.last_column)
+        if self.first_plate is not None:
+            is_selected &= (plates >= self.first_plate - 1) & (plates <= self.last_plate - 1)
+        return is_selected
+
+    def __repr__(self):
+        plates = ''
+        if self.first_plate is not None:
+            plates = str(self.first_plate) + ('-' + str(self.last_plate) if self.last_plate != self.first_plate
+                                              else '') + ':'
+        return plates + WellPositions.row_name(self.first_row) + str(self.first_column + 1) + '-' + \
+            WellPositions.row_name(self.last_row) + str(self.last_column + 1)
@@ -0,0 +1,60 @@
+import numpy
+from sample_ids import SampleIds
+
+
+class ReplicateGroups:
+    # Повторы проб: лунки объединяются в группы по ключу названия пробы (1a, 1b, 1c - повторы пробы 1) через словарь
+    # ключей, поэтому количество повторов у проб может быть любым и разным. Группы идут в порядке первой лунки, внутри
+    # группы лунки стоят в исходном порядке. Концентрации всех групп лежат одним массивом, группа задается смещением
+    # начала и количеством лунок, статистики групп считаются сразу для всех групп.
+    def __init__(self, names, concs):
+        keys, inverse = SampleIds.replicate_keys(names)
+        index = {}
+        key_groups = numpy.array([index.setdefault(key, len(index)) for key in keys], dtype=int)
+        # Словарь ключей: номер группы для каждого различного названия лунки.
+        group_of = key_groups[inverse] if len(inverse) > 0 else numpy.zeros(0, dtype=int)
+        first_wells = numpy.full(len(index), len(group_of))
+        numpy.minimum.at(first_wells, group_of, numpy.arange(len(group_of)))
+        rank = numpy.empty(len(index), dtype=int)
+        rank[numpy.argsort(first_wells, kind='stable')] = numpy.arange(len(index))
+        self.group_of = rank[group_of]
+        # Группы перенумерованы в порядке первой лунки.
+        self.order = numpy.argsort(self.group_of, kind='stable')
+        self.counts = numpy.bincount(self.group_of, minlength=len(index))
+        self.offsets = numpy.cumsum(self.counts) - self.counts
+        # Начало каждой группы, для пустого выбора смещений нет.
+        self.concs = numpy.asarray(concs, dtype=float)[self.order]
+        self.first_wells = self.order[self.offsets] if len(index) > 0 else numpy.zeros(0, dtype=int)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def reduce(self, function, values=None):
+        # Свертка значений по группам (numpy.add, numpy.minimum, numpy.maximum).
+        values = self.concs if values is None else values
+        if len(self) == 0:
+            return numpy.zeros(0)
+        return function.reduceat(values, self.offsets)
+
+    def find_means(self):
+        return self.reduce(numpy.add) / self.counts
+
+    def find_ranges(self):
+        return self.reduce(numpy.maximum) - self.reduce(numpy.minimum)
+
+    def find_cv(self):
+        # Коэффициент вариации в процентах по несмещенному стандартному отклонению. Для одной лунки и нулевого
+        # среднего коэффициент не определен (nan).
+        means = self.find_means()
+        deviations = self.concs - numpy.repeat(means, self.counts)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            sd = numpy.sqrt(self.reduce(numpy.add, deviations ** 2) / (self.counts - 1))
+            return sd / means * 100
+
+    def replicate_matrix(self, width=None):
+        # Концентрации повторов таблицей группа x повтор, недостающие повторы - nan.
+        width = max(int(self.counts.max()) if len(self) > 0 else 0, width or 0)
+        matrix = numpy.full((len(self), width), numpy.nan)
+        positions = numpy.arange(len(self.concs)) - numpy.repeat(self.offsets, self.counts)
+        matrix[numpy.repeat(numpy.arange(len(self)), self.counts), positions] = self.concs
+        return matrix
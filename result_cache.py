@@ -0,0 +1,128 @@
+import hashlib
+import os
+import pickle
+import numpy
+from enum import Enum
+
+
+class ResultCache:
+    # Кэш результатов обработки на диске. Ключ - хэш содержимого входных файлов (или самих данных) вместе с параметрами
+    # обработки, поэтому при изменении файла или параметров результат считается заново, а старая запись со временем
+    # вытесняется. Размер кэша ограничен: при превышении удаляются записи, к которым дольше всего не обращались.
+    # Записи хранятся через pickle, поэтому в папку кэша не следует класть чужие файлы.
+    version = 8
+    # Номер формата записей. Увеличивается при изменении классов, которые хранятся в кэше, старые записи при этом
+    # перестают находиться.
+    extension = '.pickle'
+    default_max_size = 100 * 1024 * 1024
+
+    def __init__(self, directory=None, max_size=None):
+        self.directory = directory or ResultCache.default_directory()
+        self.max_size = ResultCache.default_max_size if max_size is None else max_size
+        self.file_hashes = {}
+        # Хэши уже прочитанных файлов по пути, размеру и времени изменения.
+
+    @staticmethod
+    def default_directory():
+        return os.path.join(os.path.expanduser('~'), '.pcr_processing', 'cache')
+
+    def file_hash(self, file_name):
+        # Хэш содержимого файла. Файл читается кусками, пока его размер и время изменения не поменялись, он повторно
+        # не читается.
+        status = os.stat(file_name)
+        signature = (os.path.abspath(file_name), status.st_size, status.st_mtime_ns)
+        if signature not in self.file_hashes:
+            digest = hashlib.sha256()
+            with open(file_name, 'rb') as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            self.file_hashes[signature] = digest.hexdigest()
+        return self.file_hashes[signature]
+
+    @staticmethod
+    def key(*parts):
+        # Ключ записи по частям: строкам, числам, перечислениям и массивам numpy.
+        digest = hashlib.sha256(str(ResultCache.version).encode())
+        for part in parts:
+            if isinstance(part, numpy.ndarray):
+                part = numpy.ascontiguousarray(part)
+                data = part.dtype.str.encode() + str(part.shape).encode() + part.tobytes()
+            elif isinstance(part, Enum):
+                data = (type(part).__name__ + '.' + part.name).encode()
+            else:
+                data = repr(part).encode()
+            digest.update(len(data).to_bytes(8, 'little'))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ResultCache.extension)
+
+    def get(self, key):
+        # Запись по ключу или None. При обращении обновляется время записи, по которому идет вытеснение.
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            self.remove(path)
+            # Поврежденная или устаревшая запись удаляется и считается отсутствующей.
+            return None
+
+    def put(self, key, value):
+        # Запись сначала сохраняется во временный файл, поэтому параллельные процессы не видят недописанных записей.
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        temporary_path = path + '.' + str(os.getpid()) + '.tmp'
+        with open(temporary_path, 'wb') as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+        self.evict()
+
+    def get_or_compute(self, key, function):
+        value = self.get(key)
+        if value is None:
+            value = function()
+            self.put(key, value)
+        return value
+
+    def entries(self):
+        # Записи кэша: путь, размер и время последнего обращения.
+        result = []
+        if not os.path.isdir(self.directory):
+            return result
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(ResultCache.extension):
+                try:
+                    status = entry.stat()
+                except FileNotFoundError:
+                    continue
+                result.append((entry.path, status.st_size, status.st_mtime))
+        return result
+
+    def evict(self):
+        # Удаление записей, к которым дольше всего не обращались, пока размер кэша больше допустимого.
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total_size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total_size <= self.max_size:
+                break
+            self.remove(path)
+            total_size -= size
+
+    def clear(self):
+        # Сброс кэша: удаляются все записи.
+        for path, _, _ in self.entries():
+            self.remove(path)
+        self.file_hashes.clear()
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
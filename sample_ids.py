@@ -0,0 +1,107 @@
+import functools
+import re
+import numpy
+
+
+class SampleId:
+    # Разобранное название пробы: номер планшета, номер пробы и буквы повтора. Для проб без указания планшета номер
+    # планшета равен 0, для названий, которые не подходят под шаблон номера пробы, номер пробы равен -1, а пробу
+    # определяет само название (name).
+    __slots__ = ('plate', 'number', 'suffix', 'name')
+
+    def __init__(self, plate: int, number: int, suffix: str, name: str = ''):
+        self.plate = plate
+        self.number = number
+        self.suffix = suffix
+        self.name = name
+
+    def key(self):
+        # Ключ пробы для сопоставления файлов: буквы повтора не учитываются, поэтому 1a, 1b и 1 - одна проба. Ключ
+        # пробы без номера - название без учета регистра, поэтому стандарт 0.5 не совпадает с пробой 5.
+        if self.number < 0:
+            return self.name.strip().lower()
+        return self.plate, self.number
+
+    def text(self):
+        # Название пробы без букв повтора, как оно записывается в общий список.
+        if self.number < 0:
+            return self.name.strip()
+        if self.plate > 0:
+            return 'P' + str(self.plate) + '-' + str(self.number)
+        return str(self.number)
+
+    def __eq__(self, other):
+        return isinstance(other, SampleId) and (self.key(), self.suffix) == (other.key(), other.suffix)
+
+    def __hash__(self):
+        return hash((self.key(), self.suffix))
+
+    def __repr__(self):
+        return self.text() + self.suffix
+
+
+class SampleIds:
+    # Единые правила разбора названий проб для всех разделов программы. Название вида [P<планшет>-]<номер><буквы>
+    # (1a, 12, P2-15b, plate 3 7a) разбирается на части. Остальные названия (стандарты 0.5, NTC) номера пробы не
+    # имеют и сопоставляются по всему названию, цифры из них не извлекаются. Каждое название разбирается один раз,
+    # результат хранится в кэше.
+    pattern = re.compile(r'\s*(?:(?:plate|p)\s*(\d+)\s*[-_:. ]\s*)?(\d+)\s*([a-z]*)\s*', re.IGNORECASE)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=65536)
+    def parse(name: str):
+        return SampleId(*SampleIds.read(name), name)
+
+    @staticmethod
+    def read(name: str):
+        # Разбор названия без кэша: планшет, номер и буквы повтора. Используется для массивов названий, где каждое
+        # различное название и так разбирается один раз.
+        match = SampleIds.pattern.fullmatch(name)
+        if match is None:
+            return 0, -1, ''
+        plate, number, suffix = match.groups()
+        return int(plate) if plate is not None else 0, int(number), suffix.lower()
+
+    @staticmethod
+    def key(name: str):
+        return SampleIds.parse(name).key()
+
+    @staticmethod
+    def text(name: str):
+        return SampleIds.parse(name).text()
+
+    @staticmethod
+    def with_plate(name: str, plate: int):
+        # Название пробы с номером планшета, если в названии он не указан: 1a на втором планшете - P2-1a. Названия без
+        # номера пробы не меняются.
+        sample_id = SampleIds.parse(name)
+        if sample_id.plate > 0 or sample_id.number < 0:
+            return name
+        return 'P' + str(plate) + '-' + name.strip()
+
+    @staticmethod
+    def key_arrays(names):
+        # Целочисленные массивы номеров планшетов и номеров проб. Повторяющиеся названия разбираются один раз.
+        unique_names, inverse = numpy.unique(numpy.asarray(names, dtype=str), return_inverse=True)
+        ids = numpy.array([SampleIds.read(name)[:2] for name in unique_names.tolist()], dtype=numpy.int64)
+        inverse = inverse.reshape(-1)
+        return ids[inverse, 0], ids[inverse, 1]
+
+    @staticmethod
+    def replicate_keys(names):
+        # Ключи проб для объединения повторов и номера ключей для всех лунок. Лунки с одним ключом - повторы одной
+        # пробы. Названия без номера пробы не сводятся к одному номеру -1, ключом у них служит само название.
+        unique_names, inverse = numpy.unique(numpy.asarray(names, dtype=str), return_inverse=True)
+        keys = []
+        for name in unique_names.tolist():
+            plate, number, _ = SampleIds.read(name)
+            keys.append((plate, number) if number >= 0 else name.strip().lower())
+        return keys, inverse.reshape(-1)
+
+    @staticmethod
+    def sort_order(names):
+        # Порядок проб по планшету и номеру. Сортировка устойчивая, повторы одной пробы остаются в исходном порядке.
+        if len(names) == 0:
+            return numpy.zeros(0, dtype=int)
+        plates, numbers = SampleIds.key_arrays(names)
+        return numpy.lexsort((numbers, plates))
@@ -0,0 +1,189 @@
+import copy
+import datetime
+import json
+import os
+import numpy
+from enum import Enum
+
+
+class CategoricalColumn:
+    # Столбец с повторяющимися названиями (контроль/эксперимент, линия). Каждое название хранится один раз, для строк
+    # хранятся номера названий. Названия упорядочены, поэтому сортировка по номерам совпадает с сортировкой по
+    # названиям. Номер -1 означает, что значение в файле не указано, такое значение, как в прежних версиях
+    # программы, читается как 0.
+    def __init__(self, names: list, codes):
+        self.names = names
+        self.codes = codes
+
+    @staticmethod
+    def from_values(values):
+        # Кодирование списка названий, None - значение не указано.
+        names = sorted(set(value for value in values if value is not None))
+        positions = {name: code for code, name in enumerate(names)}
+        codes = numpy.array([positions.get(value, -1) for value in values], dtype=numpy.int32)
+        return CategoricalColumn(names, codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        # Для номера строки возвращается название, для массива номеров - новый столбец с теми же названиями.
+        if isinstance(index, (int, numpy.integer)):
+            code = int(self.codes[index])
+            return self.names[code] if code >= 0 else 0
+        return CategoricalColumn(self.names, self.codes[index])
+
+    def tolist(self):
+        return [self.names[code] if code >= 0 else 0 for code in self.codes.tolist()]
+
+
+class SampleRow:
+    # Представление одной строки таблицы проб. Хранит только ссылку на таблицу и номер строки, поля читаются из
+    # столбцов таблицы.
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def number_of_raw(self):
+        return int(self.table.rows[self.index])
+
+    @property
+    def number(self):
+        return str(self.table.numbers[self.index])
+
+    @property
+    def conc(self):
+        return float(self.table.concs[self.index])
+
+    @property
+    def control(self):
+        return self.table.controls[self.index]
+
+    @property
+    def line(self):
+        return self.table.lines[self.index]
+
+    def factor(self, name):
+        # Уровень фактора по названию: control, line или дополнительный фактор таблицы.
+        return self.table.factor_column(name)[self.index]
+
+
+class SampleTable:
+    # Таблица проб, хранящаяся по столбцам: номера строк файла, названия проб, концентрации и категориальные столбцы
+    # контроля/эксперимента и линии. Концентрации переводятся из текста в числа один раз при чтении файла. Объекты для
+    # отдельных проб не хранятся, при обращении к строке создается представление row_class. Дополнительные факторы
+    # плана (пол, время, воздействие) хранятся категориальными столбцами в словаре factors в порядке их столбцов в
+    # файле групп.
+    row_class = SampleRow
+    column_names = ('rows', 'numbers', 'concs', 'controls', 'lines')
+    # Столбцы, которые переставляются вместе при изменении порядка строк.
+
+    def __init__(self, numbers, concs, controls: CategoricalColumn = None, lines: CategoricalColumn = None, rows=None,
+                 factors: dict = None):
+        self.numbers = numpy.asarray(numbers, dtype=str)
+        self.concs = numpy.asarray(concs, dtype=float)
+        self.controls = controls
+        self.lines = lines
+        self.rows = numpy.arange(len(self.numbers)) if rows is None else numpy.asarray(rows, dtype=int)
+        self.factors = {} if factors is None else factors
+
+    def factor_names(self):
+        # Названия всех факторов таблицы: контроль, линия и дополнительные факторы.
+        return ['control', 'line'] + list(self.factors)
+
+    def factor_column(self, name):
+        if name == 'control':
+            return self.controls
+        if name == 'line':
+            return self.lines
+        return self.factors[name]
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __getitem__(self, index):
+        positions = range(len(self))[index]
+        if isinstance(index, slice):
+            return [self.row_class(self, position) for position in positions]
+        return self.row_class(self, positions)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.row_class(self, index)
+
+    def reorder(self, indices):
+        # В таблице остаются строки с указанными номерами в указанном порядке.
+        for name in self.column_names:
+            column = getattr(self, name)
+            if column is not None:
+                setattr(self, name, column[indices])
+        self.factors = {name: column[indices] for name, column in self.factors.items()}
+
+    def take(self, indices):
+        # Новая таблица из строк с указанными номерами, исходная таблица не меняется.
+        table = copy.copy(self)
+        table.reorder(indices)
+        return table
+
+
+class TableKind(Enum):
+    # Виды двоичных таблиц, которыми обмениваются разделы программы.
+    ordered_results = 'ordered results'
+    # Результат раздела Processing raw data, читается разделом Create full list.
+    full_list = 'full list'
+    # Результат раздела Create full list, читается разделом Statistic processing.
+
+
+class TableFile:
+    # Двоичный файл .npz с таблицей проб для передачи между разделами программы. Значения хранятся без округления и
+    # без перевода в текст, следующий раздел получает готовые массивы. В файле записана схема (вид таблицы, версия
+    # формата, типы столбцов) и происхождение (раздел, исходные файлы, параметры обработки). Категориальные столбцы
+    # хранятся двумя массивами: названия и номера названий.
+    extension = '.npz'
+    format_name = 'PCR processing table'
+    format_version = 1
+
+    @staticmethod
+    def provenance(stage: str, sources: list, parameters: dict):
+        return {'stage': stage, 'sources': [os.path.abspath(source) for source in sources],
+                'parameters': parameters, 'created': datetime.datetime.now().isoformat(timespec='seconds')}
+
+    @staticmethod
+    def write(path, kind: TableKind, columns: dict, provenance: dict):
+        arrays = {}
+        schema = {'format': TableFile.format_name, 'version': TableFile.format_version, 'kind': kind.value,
+                  'columns': {}, 'provenance': provenance}
+        for name, column in columns.items():
+            if isinstance(column, CategoricalColumn):
+                arrays[name + '.names'] = numpy.asarray(column.names, dtype=str)
+                arrays[name + '.codes'] = column.codes
+                schema['columns'][name] = 'categorical'
+            else:
+                arrays[name] = numpy.asarray(column)
+                schema['columns'][name] = arrays[name].dtype.kind
+        arrays['schema'] = numpy.array(json.dumps(schema))
+        with open(path, 'wb') as file:
+            numpy.savez(file, **arrays)
+
+    @staticmethod
+    def read(path, kind: TableKind):
+        # Чтение столбцов таблицы. Если файл не является таблицей нужного вида, то возникает ValueError.
+        with numpy.load(path, allow_pickle=False) as arrays:
+            if 'schema' not in arrays.files:
+                raise ValueError(path + ' is not a ' + TableFile.format_name + ' file')
+            schema = json.loads(str(arrays['schema']))
+            if schema.get('format') != TableFile.format_name or schema.get('version') != TableFile.format_version:
+                raise ValueError(path + ' has unsupported format ' + str(schema.get('format')) + ' ' +
+                                 str(schema.get('version')))
+            if schema.get('kind') != kind.value:
+                raise ValueError(path + ' contains ' + str(schema.get('kind')) + ' instead of ' + kind.value)
+            columns = {}
+            for name, column_type in schema['columns'].items():
+                if column_type == 'categorical':
+                    columns[name] = CategoricalColumn(arrays[name + '.names'].tolist(), arrays[name + '.codes'])
+                else:
+                    columns[name] = arrays[name]
+        return columns
@@ -0,0 +1,192 @@
+import numpy
+from enum import Enum
+from sample_ids import SampleIds
+
+
+class QuantificationMode(Enum):
+    # Способы получения концентраций проб в разделе Processing raw data.
+    instrument = 'instrument'
+    # Концентрации, посчитанные прибором (столбец Concentration).
+    standard_curve = 'standard curve'
+    # Концентрации по стандартной кривой, построенной по лункам стандартов файла (столбцы Cp и Standard).
+    delta_delta_ct = 'ddct'
+    # Относительные количества E^(Cp калибратора - Cp). Отношение целевого гена к референсному в разделе Create full
+    # list тогда равно E^-ddCt.
+
+
+class StandardCurve:
+    # Стандартная кривая Cp = intercept + slope * log10(концентрация), построенная методом наименьших квадратов по
+    # лункам стандартов.
+    __slots__ = ('slope', 'intercept', 'r_squared', 'points')
+
+    def __init__(self, slope, intercept, r_squared, points):
+        self.slope = slope
+        self.intercept = intercept
+        self.r_squared = r_squared
+        self.points = points
+
+    @staticmethod
+    def fit(standards, cps):
+        # standards - известные концентрации стандартов (0 у проб), cps - Cp всех лунок (nan у лунок без сигнала).
+        is_point = (standards > 0) & numpy.isfinite(cps)
+        log_concs = numpy.log10(standards[is_point])
+        point_cps = cps[is_point]
+        if len(point_cps) < 2 or numpy.ptp(log_concs) == 0:
+            raise ValueError('Standard curve needs standards of at least two concentrations with Cp')
+        slope, intercept = numpy.polyfit(log_concs, point_cps, 1)
+        residual = numpy.sum((point_cps - (intercept + slope * log_concs)) ** 2)
+        total = numpy.sum((point_cps - point_cps.mean()) ** 2)
+        r_squared = 1 - residual / total if total > 0 else 1.0
+        return StandardCurve(float(slope), float(intercept), float(r_squared), len(point_cps))
+
+    def amplification(self):
+        # Увеличение количества матрицы за один цикл, 2 при эффективности 100%.
+        return 10 ** (-1 / self.slope)
+
+    def efficiency(self):
+        return self.amplification() - 1
+
+    def find_concs(self, cps):
+        # Концентрации по Cp для всех лунок сразу. Лунки без сигнала получают 0, как пустая концентрация прибора.
+        with numpy.errstate(over='ignore', invalid='ignore'):
+            concs = 10 ** ((cps - self.intercept) / self.slope)
+        return numpy.where(numpy.isfinite(concs), concs, 0.0)
+
+    def parameters(self):
+        # Параметры кривой для описания результата в двоичной таблице.
+        return {'slope': self.slope, 'intercept': self.intercept, 'efficiency': self.efficiency(),
+                'r squared': self.r_squared}
+
+    def __repr__(self):
+        return 'Standard curve: slope ' + str(round(self.slope, 3)) + ', intercept ' + str(round(self.intercept, 2)) + \
+            ', efficiency ' + str(round(self.efficiency() * 100, 1)) + '%, R2 ' + str(round(self.r_squared, 4)) + \
+            ', ' + str(self.points) + ' standards'
+
+
+class StandardCurves(dict):
+    # Стандартные кривые планшетов файла: номер планшета (с нуля) - кривая по стандартам этого планшета, поэтому
+    # пробы каждого планшета пересчитываются с эффективностью своего планшета. Лунки планшетов без своих стандартов
+    # пересчитываются по общей кривой, построенной по стандартам всех планшетов.
+    def __init__(self, common: StandardCurve, plates):
+        super().__init__()
+        self.common = common
+        self.plates = plates
+        # Все планшеты файла.
+
+    @staticmethod
+    def fit(plates, standards, cps):
+        curves = StandardCurves(StandardCurve.fit(standards, cps), numpy.unique(plates).tolist())
+        is_point = (standards > 0) & numpy.isfinite(cps)
+        for plate in curves.plates:
+            is_plate = is_point & (plates == plate)
+            if len(numpy.unique(standards[is_plate])) >= 2:
+                # Для кривой планшета нужны стандарты хотя бы двух концентраций.
+                curves[plate] = StandardCurve.fit(standards[is_plate], cps[is_plate])
+        return curves
+
+    def curve_of(self, plate):
+        return self.get(plate, self.common)
+
+    def has_common_plates(self):
+        # Есть планшеты без своих стандартов или кривые планшетов не построены.
+        return len(self) < len(self.plates)
+
+    def find_concs(self, plates, cps):
+        # Концентрации всех лунок по кривым их планшетов.
+        concs = numpy.zeros(len(cps))
+        for plate in self.plates:
+            is_plate = plates == plate
+            concs[is_plate] = self.curve_of(plate).find_concs(cps[is_plate])
+        return concs
+
+    def find_amplifications(self, plates):
+        # Увеличение количества матрицы за один цикл для каждой лунки по кривой ее планшета.
+        amplifications = numpy.zeros(len(plates))
+        for plate in self.plates:
+            amplifications[plates == plate] = self.curve_of(plate).amplification()
+        return amplifications
+
+    def parameters(self):
+        # Параметры кривых для описания результата. Для одного набора стандартов записываются параметры одной кривой,
+        # как раньше.
+        if len(self) <= 1:
+            return self.common.parameters()
+        curves = {'plate ' + str(plate + 1): curve.parameters() for plate, curve in sorted(self.items())}
+        if self.has_common_plates():
+            curves['common'] = self.common.parameters()
+        return {'standard curves': curves}
+
+    def __repr__(self):
+        if len(self) <= 1:
+            return repr(self.common)
+        lines = ['Plate ' + str(plate + 1) + ': ' + repr(curve) for plate, curve in sorted(self.items())]
+        if self.has_common_plates():
+            lines.append('Other plates: ' + repr(self.common))
+        return '\n'.join(lines)
+
+
+class Quantification:
+    # Параметры расчета концентраций в разделе Processing raw data. Для режима ddCt калибратор - название пробы, Cp
+    # которой вычитается из Cp всех лунок того же планшета. Если калибратор не задан, то вычитается средний Cp
+    # обрабатываемых проб планшета (выбранных строк или области планшетов, без стандартов и лунок без матрицы вне
+    # этого диапазона). Если эффективность не задана, то она берется из стандартной кривой планшета, а без стандартов
+    # считается равной 100%.
+    def __init__(self, mode: QuantificationMode = QuantificationMode.instrument, calibrator: str = None,
+                 efficiency: float = None):
+        self.mode = mode
+        self.calibrator = calibrator
+        self.efficiency = efficiency
+
+    def key(self):
+        # Параметры для ключа кэша.
+        return self.mode, self.calibrator, self.efficiency
+
+    def find_concs(self, numbers, concs, cps, standards, plates, sample_indices=None):
+        # Концентрации всех лунок в выбранном режиме и стандартные кривые планшетов, если они строились. plates -
+        # номера планшетов лунок, sample_indices - строки обрабатываемых проб, по умолчанию все лунки, которые не
+        # являются стандартами.
+        if self.mode == QuantificationMode.instrument:
+            return concs, None
+        has_standards = numpy.count_nonzero((standards > 0) & numpy.isfinite(cps)) >= 2
+        if self.mode == QuantificationMode.standard_curve:
+            curves = StandardCurves.fit(plates, standards, cps)
+            return Quantification.round_like_instrument(curves.find_concs(plates, cps)), curves
+        curves = StandardCurves.fit(plates, standards, cps) if has_standards and self.efficiency is None else None
+        if self.efficiency is not None:
+            amplification = 1 + self.efficiency
+        else:
+            amplification = curves.find_amplifications(plates) if curves is not None else 2.0
+        calibrator_cps = self.find_calibrator_cps(numbers, cps, standards, plates, sample_indices)
+        with numpy.errstate(over='ignore', invalid='ignore'):
+            quantities = amplification ** (calibrator_cps - cps)
+        return Quantification.round_like_instrument(numpy.where(numpy.isfinite(quantities), quantities, 0.0)), curves
+
+    @staticmethod
+    def round_like_instrument(concs):
+        # Округление до трех значащих цифр, как прибор записывает концентрации (8.28E-1).
+        return numpy.char.mod('%.2E', concs).astype(float)
+
+    def find_calibrator_cps(self, numbers, cps, standards, plates, sample_indices=None):
+        # Средний Cp лунок калибратора на планшете каждой лунки. Повторы калибратора находятся по номеру пробы без
+        # букв повторов. Калибратор нужен на каждом планшете, на котором есть обрабатываемые пробы, у лунок остальных
+        # планшетов Cp калибратора не определен (nan).
+        is_selected = numpy.ones(len(cps), dtype=bool)
+        if sample_indices is not None:
+            is_selected[:] = False
+            is_selected[sample_indices] = True
+        is_sample = (standards <= 0) & numpy.isfinite(cps) & is_selected
+        if self.calibrator is None:
+            is_calibrator = is_sample
+        else:
+            calibrator_key = SampleIds.key(self.calibrator)
+            keys, inverse = SampleIds.replicate_keys(numbers)
+            is_calibrator = is_sample & numpy.array([key == calibrator_key for key in keys], dtype=bool)[inverse]
+        calibrator_cps = numpy.full(len(cps), numpy.nan)
+        selected_plates = numpy.unique(plates[is_selected & (standards <= 0)]).tolist()
+        for plate in selected_plates:
+            is_plate = plates == plate
+            if not numpy.any(is_calibrator & is_plate):
+                raise ValueError('No Cp for calibrator ' + (self.calibrator or 'samples') +
+                                 (' on plate ' + str(plate + 1) if len(selected_plates) > 1 else ''))
+            calibrator_cps[is_plate] = cps[is_calibrator & is_plate].mean()
+        return calibrator_cps
@@ -0,0 +1,148 @@
+import argparse
+import math
+import os
+import numpy
+from plate_layout import PlateFormat
+
+
+class SyntheticRun:
+    # Искусственный прогон для проверки скорости обработки: экспорт LightCycler 480 для целевого и референсного генов
+    # (как lps hc nos2.txt и lps hc pol.txt) и файл групп (как group.txt). Первый ряд первого планшета занимают
+    # стандарты, остальные лунки - пробы, повторы одной пробы стоят в соседних лунках. Несколько планшетов
+    # записываются в один файл подряд, каждый со своими строками заголовка. Концентрации целевого гена зависят от
+    # уровней факторов, поэтому дисперсионный анализ находит влияние факторов. Данные полностью определяются seed.
+    slope = -3.32
+    intercept = 28.4
+    # Стандартная кривая: Cp = intercept + slope * log10(концентрация).
+    dropout = 0.02
+    # Доля лунок без сигнала, у них пустые Cp и концентрация.
+    control_levels = ['bl', 'tnf ko']
+    line_levels = ['saline', 'lps_50', 'lps_200']
+    header = 'Include\tColor\tPos\tName\tCp\tConcentration\tStandard\tStatus\n'
+
+    def __init__(self, plates=1, wells=96, factors=2, replicates=2, levels=2, seed=38):
+        self.plates = plates
+        self.plate_format = PlateFormat.from_wells(wells)
+        self.replicates = replicates
+        self.generator = numpy.random.default_rng(seed)
+        columns = self.plate_format.value[1]
+        self.standards = [61 / 2 ** step for step in range(columns - 1)] + [0]
+        # Ряд стандартов: двукратные разведения и лунка без матрицы.
+        self.number_of_samples = (plates * wells - columns) // replicates
+        self.factor_names = (['cont', 'line'] + ['factor_' + str(factor + 1) for factor in range(2, factors)])[:factors]
+        line_levels = SyntheticRun.line_levels + ['line_' + str(level + 1) for level in range(3, levels)]
+        self.factor_levels = [SyntheticRun.control_levels, line_levels[:levels]]
+        self.factor_levels += [['level_' + str(level + 1) for level in range(levels)] for _ in range(2, factors)]
+        self.factor_levels = self.factor_levels[:factors]
+        # Контроль всегда имеет два уровня, остальные факторы - levels уровней.
+        self.factor_codes = [self.generator.integers(0, len(levels), self.number_of_samples)
+                             for levels in self.factor_levels]
+        effects = sum(self.generator.normal(0, 0.3, len(levels))[codes]
+                      for levels, codes in zip(self.factor_levels, self.factor_codes))
+        self.reference_concs = self.generator.lognormal(numpy.log(20), 0.5, self.number_of_samples)
+        self.target_concs = self.reference_concs * numpy.exp(numpy.log(0.02) + effects)
+        # Истинные концентрации проб, лунки получают их с разбросом повторов.
+
+    def well_concs(self, concs):
+        # Концентрации всех лунок проб с разбросом повторов и лунками без сигнала (nan).
+        values = numpy.repeat(concs, self.replicates) * self.generator.lognormal(0, 0.1, len(concs) *
+                                                                                   self.replicates)
+        values[self.generator.random(len(values)) < SyntheticRun.dropout] = numpy.nan
+        return values
+
+    @staticmethod
+    def format_conc(conc):
+        # Концентрация в записи прибора: 6.25E1, 3.72E-2.
+        if conc != conc:
+            return ''
+        mantissa, exponent = '{:.2E}'.format(conc).split('E')
+        return mantissa + 'E' + str(int(exponent))
+
+    @staticmethod
+    def format_cp(conc):
+        if conc != conc or conc <= 0:
+            return ''
+        return '{:.2f}'.format(SyntheticRun.intercept + SyntheticRun.slope * math.log10(conc))
+
+    def sample_name(self, well):
+        return str(well // self.replicates + 1) + 'abcdefghij'[well % self.replicates]
+
+    def export_lines(self, title, concs):
+        # Строки экспорта прибора для всех планшетов.
+        positions = self.plate_format.positions()
+        well_concs = self.well_concs(concs).tolist()
+        well = 0
+        for plate in range(self.plates):
+            yield 'Experiment: ' + title + ' plate ' + str(plate + 1) + '  Selected Filter: SYBR Green I / HRM Dye ' \
+                  '(465-510)\n'
+            yield SyntheticRun.header
+            for index, position in enumerate(positions):
+                if plate == 0 and index < len(self.standards):
+                    standard = self.standards[index]
+                    name = '{:g}'.format(standard)
+                    yield '\t'.join(['True', '128', position, name, SyntheticRun.format_cp(standard),
+                                     SyntheticRun.format_conc(standard) if standard > 0 else '', name, '']) + '\n'
+                elif well < len(well_concs):
+                    conc = well_concs[well]
+                    yield '\t'.join(['True', '255', position, self.sample_name(well), SyntheticRun.format_cp(conc),
+                                     SyntheticRun.format_conc(conc), '0', '']) + '\n'
+                    well += 1
+                else:
+                    yield '\t'.join(['False', '255', position, '', '', '', '0', '']) + '\n'
+                    # Свободные лунки последнего планшета не входят в обработку.
+
+    def group_lines(self):
+        # Строки файла групп. Номера проб записываются без букв повторов, как их записывает раздел
+        # Processing raw data.
+        yield ';'.join(['number'] + self.factor_names) + '\n'
+        for sample in range(self.number_of_samples):
+            names = [levels[codes[sample]] for levels, codes in zip(self.factor_levels, self.factor_codes)]
+            yield ';'.join([str(sample + 1)] + names) + '\n'
+
+    def first_raw(self):
+        # Первая строка проб: строки стандартов в обработку не входят.
+        return len(self.standards)
+
+    def last_raw(self):
+        return len(self.standards) + self.number_of_samples * self.replicates - 1
+
+    def write(self, directory, name='synthetic'):
+        # Запись экспортов целевого и референсного генов, файла групп и манифеста для пакетной обработки. Возвращает
+        # пути к файлам.
+        os.makedirs(directory, exist_ok=True)
+        paths = {'target': os.path.join(directory, name + ' target.txt'),
+                 'reference': os.path.join(directory, name + ' reference.txt'),
+                 'group': os.path.join(directory, name + ' group.txt'),
+                 'manifest': os.path.join(directory, 'manifest.txt')}
+        for kind, concs in (('target', self.target_concs), ('reference', self.reference_concs)):
+            with open(paths[kind], 'w') as file:
+                file.writelines(self.export_lines(name + ' ' + kind, concs))
+        with open(paths['group'], 'w') as file:
+            file.writelines(self.group_lines())
+        with open(paths['manifest'], 'w') as file:
+            file.write('file;first raw;last raw;quantity;reference;group\n')
+            for kind, reference, group in (('target', paths['reference'], paths['group']), ('reference', '', '')):
+                file.write(';'.join([os.path.basename(paths[kind]), str(self.first_raw()), str(self.last_raw()), '2',
+                                     os.path.basename(reference), os.path.basename(group)]) + '\n')
+        return paths
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic LightCycler 480 run with a group file.')
+    parser.add_argument('directory', help='folder for the generated files')
+    parser.add_argument('--plates', type=int, default=1, help='number of plates in one export (default 1)')
+    parser.add_argument('--wells', type=int, default=96, choices=[96, 384], help='wells per plate (default 96)')
+    parser.add_argument('--factors', type=int, default=2, help='number of factor columns in the group file')
+    parser.add_argument('--levels', type=int, default=2, help='levels of each factor after the control (default 2)')
+    parser.add_argument('--replicates', type=int, default=2, help='wells per sample (default 2)')
+    parser.add_argument('--seed', type=int, default=38)
+    parser.add_argument('--name', default='synthetic', help='prefix of the file names')
+    arguments = parser.parse_args(arguments)
+    run = SyntheticRun(arguments.plates, arguments.wells, arguments.factors, arguments.replicates, arguments.levels,
+                       arguments.seed)
+    for kind, path in run.write(arguments.directory, arguments.name).items():
+        print(kind + '\t' + path)
+
+
+if __name__ == '__main__':
+    main()
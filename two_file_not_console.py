@@ -1,17 +1,22 @@
 from enum import Enum
+import os
+import numpy
 import tkinter.filedialog as tk
+from background_jobs import JobControls
+from instrumentation import Trace, traced
+from result_cache import ResultCache
+from sample_ids import SampleIds
+from sample_table import CategoricalColumn, SampleRow, SampleTable, TableFile, TableKind
 
 
-class Sample: 
-    # Класс для объектов из списков. один объект - одна проба.
-    def __init__(self, number, conc, control, line):
-        self.number = number
-        self.conc = conc
-        self.control = control
-        self.line = line
+class Sample(SampleRow):
+    # Строка таблицы из списков. одна строка - одна проба.
+    __slots__ = ()
 
     def __repr__(self):
-        return str(self.number) + '\t' + str(self.conc) + '\t' + str(self.control) + '\t' + str(self.line) + '\n'
+        factors = ''.join('\t' + str(self.factor(name)) for name in self.table.factors)
+        return str(self.number) + '\t' + str(self.conc) + '\t' + str(self.control) + '\t' + str(self.line) + factors + \
+            '\n'
 
 
 class ParsingType(Enum): 
@@ -20,32 +25,67 @@ class ParsingType(Enum):
     group_name = 1
 
 
-class GeneSampleList(list): 
-    # Лист для проб с целевым геном.
+class GeneSampleList(SampleTable):
+    # Таблица для проб с целевым геном.
+    row_class = Sample
+
     def __init__(self, file_name: str, parsing_type: ParsingType):
-        super().__init__()
-        file_text = GeneSampleList.load_file(file_name)
-        for element in GeneSampleList.parse_file_text(file_text, parsing_type):
-            # Элементы добавляются в лист построчно из файла.
-            self.append(element)
+        if parsing_type == ParsingType.sample_average and file_name.endswith(TableFile.extension):
+            super().__init__(*GeneSampleList.read_binary(file_name))
+            # Двоичная таблица из раздела Processing raw data читается без разбора текста.
+        else:
+            file_text = GeneSampleList.load_file(file_name)
+            super().__init__(*GeneSampleList.parse_file_text(file_text, parsing_type))
+            # Столбцы таблицы заполняются построчно из файла.
 
     @staticmethod
-    def parse_file_text(file_text, parsing_type): 
-        # Разделение строчки на отдельные части и назначение полей класса Sample. В зависимости от типа может делить как
-        #  обычный файл с пробами или как файл с названиями групп.
+    @traced('full list: read binary')
+    def read_binary(file_name):
+        # Номера проб и неокругленные средние концентрации из двоичной таблицы.
+        columns = TableFile.read(file_name, TableKind.ordered_results)
+        numbers = [SampleIds.text(number) for number in columns['number'].tolist()]
+        return numbers, columns['aver'], None, None
+
+    @staticmethod
+    @traced('full list: parse')
+    def parse_file_text(file_text, parsing_type):
+        # Разделение строчек на отдельные части, возвращает столбцы таблицы: номера, концентрации, контроль и линию.
+        # В зависимости от типа может делить как обычный файл с пробами или как файл с названиями групп. В файле групп
+        # после контроля и линии могут идти столбцы дополнительных факторов, их названия берутся из заголовка.
+        numbers, concs, controls, lines = [], [], [], []
         if parsing_type == ParsingType.sample_average:
+            header = str.split(file_text[0]) if len(file_text) > 0 else []
+            aver_column = header.index('aver') if 'aver' in header else 3
+            # Количество столбцов концентраций повторов зависит от количества повторов, среднее ищется по заголовку.
             for line in file_text[1:]:
-                parts = str.split(line)
-                parts[0] = tk.re.sub('\D', '', parts[0])
-                yield Sample(parts[0], parts[3] if parts[3] != '' else '0', '', '')
-        elif parsing_type == ParsingType.group_name:
-            for line in file_text[1:]:
-                parts = str.split(line, ';')
-                # parts[0] = tk.re.sub('\D', '', parts[0])
-                try:
-                    yield Sample(parts[0], '', parts[1], parts[2])
-                except IndexError:
-                    yield Sample(parts[0], '', parts[1].strip('\n'), '\n')
+                parts = str.split(line.rstrip('\n'), '\t')
+                numbers.append(SampleIds.text(parts[0]))
+                concs.append(parts[aver_column] if parts[aver_column] != '' else '0')
+            return numbers, numpy.asarray(concs, dtype=float), None, None
+            # Концентрации переводятся в числа один раз для всего файла.
+        factor_names = GeneSampleList.find_factor_names(file_text[0] if len(file_text) > 0 else '')
+        factor_values = [[] for _ in factor_names]
+        for line in file_text[1:]:
+            parts = str.split(line.rstrip('\n'), ';')
+            controls.append(parts[1])
+            lines.append(parts[2] if len(parts) > 2 else '')
+            for values, part in zip(factor_values, parts[3:] + [''] * len(factor_names)):
+                values.append(part if part.strip() != '' else None)
+            # Пустой или отсутствующий дополнительный фактор считается не указанным.
+            numbers.append(parts[0])
+        factors = {name: CategoricalColumn.from_values(values) for name, values in zip(factor_names, factor_values)}
+        return numbers, numpy.full(len(numbers), numpy.nan), CategoricalColumn.from_values(controls), \
+            CategoricalColumn.from_values(lines), None, factors
+
+    @staticmethod
+    def find_factor_names(header):
+        # Названия дополнительных факторов из заголовка файла групп number;cont;line;... Пробелы в названиях
+        # заменяются на _, так как названия записываются в заголовок файла для раздела Statistic processing.
+        names = []
+        for name in str.split(header.rstrip('\n'), ';')[3:]:
+            name = name.strip().replace(' ', '_') or 'factor_' + str(len(names) + 3)
+            names.append(name)
+        return names
 
     @staticmethod
     def load_file(file_name):
@@ -68,39 +108,143 @@ class GroupNameList(GeneSampleList):
         super().__init__(file_name, parsing_type)
 
 
-class SampleReadyForProcessing: 
-    # Класс объектов, где каждый объект - одна проба со своим номером, отношением целевого гена к референсному в ста
-    # копиях, названия линий (контроль/эксперимент, типы эксперимента).
-    def __init__(self, number, comparison, control, line):
-        self.number = number
-        self.comparison = comparison
-        self.control = control
-        self.line = line
+class SampleReadyForProcessing(SampleRow):
+    # Строка таблицы, где каждая строка - одна проба со своим номером, отношением целевого гена к референсному в ста
+    # копиях, названия линий (контроль/эксперимент, типы эксперимента). Отношение хранится в столбце концентраций.
+    __slots__ = ()
+
+    @property
+    def comparison(self):
+        return self.conc
 
     def __repr__(self):
-        return self.number + '\t' + str(self.comparison) + '\t' + self.control.replace(' ', '_') + '\t' + self.line
+        factors = ''.join('\t' + str(self.factor(name)).strip().replace(' ', '_') for name in self.table.factors)
+        return self.number + '\t' + str(self.comparison) + '\t' + self.control.replace(' ', '_') + '\t' + self.line + \
+            factors + '\n'
 
 
-class ListSampleForProcessing(list): 
-    # Класс-список с объектами-пробами.
-    def __init__(self, gene_list: GeneSampleList, comparative_list: ComparativeSampleList, group_list: GroupNameList):
+class JoinReport:
+    # Отчет о пробах, которые при сопоставлении файлов не нашли пары или встретились в файле несколько раз.
+    def __init__(self):
+        self.unmatched = []
+        self.duplicates = []
+
+    def is_empty(self):
+        return len(self.unmatched) == 0 and len(self.duplicates) == 0
+
+    def __repr__(self):
+        lines = []
+        for list_name, number in self.unmatched:
+            lines.append('No pair for sample ' + number + ' from ' + list_name + ' file')
+        for list_name, number in self.duplicates:
+            lines.append('Sample ' + number + ' is repeated in ' + list_name + ' file')
+        return '\n'.join(lines)
+
+
+class SampleIndex(dict):
+    # Словарь номеров строк таблицы по ключу пробы (планшет, номер), поэтому 1, 01 и 1a в разных файлах - одна проба.
+    # Если ключ повторяется, то в индекс попадает первая проба, а повтор записывается в отчет.
+    def __init__(self, source_list: GeneSampleList, list_name: str, report: JoinReport):
         super().__init__()
+        self.names = source_list.numbers.tolist()
+        for row, number in enumerate(self.names):
+            key = SampleIds.key(number)
+            if key in self:
+                report.duplicates.append((list_name, number))
+            else:
+                self[key] = row
+
+    def rows(self, keys):
+        # Номера строк таблицы для списка ключей проб.
+        return numpy.array([self[key] for key in keys], dtype=int)
+
+    def name(self, key):
+        # Название пробы в файле, из которого построен индекс.
+        return self.names[self[key]]
+
+
+class ListSampleForProcessing(SampleTable):
+    # Таблица проб, готовых к статистической обработке.
+    row_class = SampleReadyForProcessing
+
+    @traced('full list: join')
+    def __init__(self, gene_list: GeneSampleList, comparative_list: ComparativeSampleList, group_list: GroupNameList):
+        self.report = JoinReport()
         # Comparing gene item, comparative item and group item by fist field in class - number of item.
-        for i in range(0, len(gene_list)):
-            number_of_item = gene_list[i].number
-            for comparative_item in comparative_list:
-                if comparative_item.number == number_of_item:
-                    comparison = 0.0
-                    if comparative_item != 0:
-                        comparison = round(((float(gene_list[i].conc)/float(comparative_item.conc))*100), 3)
-                        # Сравнение целевого гена с референсным в ста копиях.
-                    for group_item in group_list:
-                        if group_item.number == number_of_item:
-                            self.append(SampleReadyForProcessing(gene_list[i].number, comparison, group_item.control,
-                                                         group_item.line))
+        gene_index = SampleIndex(gene_list, 'gene', self.report)
+        comparative_index = SampleIndex(comparative_list, 'reference', self.report)
+        group_index = SampleIndex(group_list, 'group', self.report)
+        joined_keys = []
+        for key in gene_index:
+            if key in comparative_index and key in group_index:
+                joined_keys.append(key)
+        for list_name, index in (('gene', gene_index), ('reference', comparative_index), ('group', group_index)):
+            for key in index:
+                if key not in gene_index or key not in comparative_index or key not in group_index:
+                    self.report.unmatched.append((list_name, index.name(key)))
+        # Пробы без пары во всех трех файлах не попадают в список, но записываются в отчет.
+        Trace.count('full list: joined samples', len(joined_keys))
+        Trace.count('full list: unmatched samples', len(self.report.unmatched))
+
+        gene_concs = gene_list.concs[gene_index.rows(joined_keys)]
+        comparative_concs = comparative_list.concs[comparative_index.rows(joined_keys)]
+        self.comparisons = ListSampleForProcessing.calculate_comparison(gene_concs, comparative_concs)
+        # Отношения без округления для двоичной таблицы.
+        group_rows = group_index.rows(joined_keys)
+        joined_numbers = [gene_index.name(key) for key in joined_keys]
+        super().__init__(joined_numbers, [round(comparison, 3) for comparison in self.comparisons.tolist()],
+                         group_list.controls[group_rows], group_list.lines[group_rows],
+                         factors={name: column[group_rows] for name, column in group_list.factors.items()})
+        # Названия групп берутся из файла групп без повторного кодирования.
+
+    @staticmethod
+    def calculate_comparison(gene_concs, comparative_concs):
+        # Сравнение целевого гена с референсным в ста копиях. Если концентрация референсного гена равна нулю, то
+        # отношение равно нулю.
+        is_defined = comparative_concs != 0
+        divider = numpy.where(is_defined, comparative_concs, 1)
+        return numpy.where(is_defined, gene_concs / divider * 100, 0.0)
+
+
+class GenePanel:
+    # Панель из нескольких целевых генов, посчитанных против одного референсного гена с одним файлом групп. Файл групп
+    # и референсный ген сопоставляются один раз, отношения для всех генов хранятся матрицей проба x ген.
+    @traced('full list: join panel')
+    def __init__(self, gene_lists: dict, comparative_list: ComparativeSampleList, group_list: GroupNameList):
+        self.report = JoinReport()
+        self.gene_names = list(gene_lists)
+        comparative_index = SampleIndex(comparative_list, 'reference', self.report)
+        group_index = SampleIndex(group_list, 'group', self.report)
+        gene_indexes = [SampleIndex(gene_lists[name], name, self.report) for name in self.gene_names]
+        keys = [key for key in group_index if key in comparative_index and
+                all(key in gene_index for gene_index in gene_indexes)]
+        # В панель попадают только пробы, которые есть во всех файлах, остальные записываются в отчет.
+        self.numbers = [group_index.name(key) for key in keys]
+        joined_keys = set(keys)
+        for list_name, index in [('reference', comparative_index), ('group', group_index)] + \
+                list(zip(self.gene_names, gene_indexes)):
+            for key in index:
+                if key not in joined_keys:
+                    self.report.unmatched.append((list_name, index.name(key)))
+        group_rows = group_index.rows(keys)
+        self.controls = [control.strip().replace(' ', '_') for control in group_list.controls[group_rows].tolist()]
+        self.lines = [line.strip() for line in group_list.lines[group_rows].tolist()]
+        self.factors = {name: [str(value).strip().replace(' ', '_') for value in column[group_rows].tolist()]
+                        for name, column in group_list.factors.items()}
+        # Не указанный дополнительный фактор записывается как 0 и, как и контроль 0, не входит в группы.
+        comparative_concs = comparative_list.concs[comparative_index.rows(keys)]
+        gene_concs = numpy.column_stack([gene_lists[name].concs[gene_index.rows(keys)]
+                                         for name, gene_index in zip(self.gene_names, gene_indexes)])
+        self.comparisons = numpy.round(ListSampleForProcessing.calculate_comparison(gene_concs,
+                                                                                    comparative_concs[:, None]), 3)
+        # Отношение целевого гена к референсному в ста копиях для всех генов сразу.
+
 
 class LogicLayer: 
     # Логическая составляющая интерфейса.
+    def __init__(self, cache: ResultCache = None):
+        self.cache = cache
+        # Кэш результатов на диске. Если кэш не задан, то файлы сопоставляются заново при каждом запуске.
 
     def open_gene_file(self):
         # Метод кнопки открытия файла с целевым геном, возвращает набор строчек и полное имя файла.
@@ -120,35 +264,84 @@ class LogicLayer:
         self.group_file_name = open_path
         return open_path
 
-    def resume_processing(self):
-        # Метод продолжения работы после указания всех фалов, возвращает обработанные упорядоченные пробы.
-        gene = GeneSampleList(self.gene_file_name, ParsingType.sample_average)
-        comparative = ComparativeSampleList(self.comparative_file_name, ParsingType.sample_average)
-        group = GroupNameList(self.group_file_name, ParsingType.group_name)
-        self.tempsamples = ListSampleForProcessing(gene, comparative, group)
+    def resume_processing(self, job=None):
+        # Метод продолжения работы после указания всех фалов, возвращает обработанные упорядоченные пробы. Если метод
+        # выполняется в фоновой задаче job, то он сообщает ей о ходе работы.
+        if self.cache is not None:
+            key = ResultCache.key('full list', self.cache.file_hash(self.gene_file_name),
+                                  self.cache.file_hash(self.comparative_file_name),
+                                  self.cache.file_hash(self.group_file_name),
+                                  [os.path.splitext(name)[1] for name in (self.gene_file_name,
+                                                                          self.comparative_file_name)])
+            # Расширение входит в ключ, так как от него зависит способ чтения файла.
+            self.tempsamples = self.cache.get_or_compute(key, lambda: self.join_lists(job))
+        else:
+            self.tempsamples = self.join_lists(job)
         result = ''
         for sample in self.tempsamples:
             result += sample.__repr__()
         return result
 
+    @traced('full list: load files')
+    def join_lists(self, job=None):
+        # Чтение трех файлов и сопоставление проб.
+        if job is not None:
+            job.report_progress('Reading files')
+        gene = GeneSampleList(self.gene_file_name, ParsingType.sample_average)
+        comparative = ComparativeSampleList(self.comparative_file_name, ParsingType.sample_average)
+        group = GroupNameList(self.group_file_name, ParsingType.group_name)
+        if job is not None:
+            job.report_progress('Joining lists')
+        return ListSampleForProcessing(gene, comparative, group)
+
     def save_results_to_file(self):
         # Метод сохранения результата в текстовый файл построчно.
-        save_path = tk.asksaveasfilename(filetypes=[('text files', '.txt'), ('all files', '.*')],
-                                         initialfile='proANOVA.txt')
+        save_path = tk.asksaveasfilename(filetypes=[('text files', '.txt'), ('binary tables', '.npz'),
+                                                    ('all files', '.*')], initialfile='proANOVA.txt')
+        self.write_results(save_path)
+        print(self.header())
+        for sample in self.tempsamples:
+            print(sample)
+
+    @traced('full list: write results')
+    def write_results(self, save_path):
+        # Запись результата в текстовый файл по известному пути. Если путь оканчивается на .npz, то результат
+        # записывается двоичной таблицей для раздела Statistic processing.
+        if save_path.endswith(TableFile.extension):
+            self.write_binary(save_path)
+            return
         file = open(save_path, 'w')
-        file.write('number\tmean\tline\n')
-        print('number\tmean\tline')
+        file.write(self.header() + '\n')
         for sample in self.tempsamples:
             file.write(str(sample))
-            print(sample)
         file.close()
 
+    def header(self):
+        # Заголовок файла результата. Названия дополнительных факторов дописываются после названий прежних столбцов.
+        return 'number\tmean\tline' + ''.join('\t' + name for name in self.tempsamples.factors)
+
+    def write_binary(self, save_path):
+        # Названия групп записываются так же, как их прочитает раздел Statistic processing из текстового файла:
+        # пробелы в названии контроля заменяются на _, пустая линия считается не указанной.
+        controls = [control.strip().replace(' ', '_') for control in self.tempsamples.controls.tolist()]
+        lines = [line.strip() if line.strip() != '' else None for line in self.tempsamples.lines.tolist()]
+        columns = {'number': self.tempsamples.numbers, 'mean': self.tempsamples.comparisons,
+                   'control': CategoricalColumn.from_values(controls), 'line': CategoricalColumn.from_values(lines)}
+        for name, column in self.tempsamples.factors.items():
+            values = [value.strip().replace(' ', '_') if isinstance(value, str) and value.strip() != '' else None
+                      for value in column.tolist()]
+            columns[name] = CategoricalColumn.from_values(values)
+        # Дополнительные факторы записываются после линии под своими названиями.
+        provenance = TableFile.provenance('Create full list', [self.gene_file_name, self.comparative_file_name,
+                                                               self.group_file_name], {})
+        TableFile.write(save_path, TableKind.full_list, columns, provenance)
+
 
 class Interfacing:
     # Класс для графического отображения интерфейса.
 
     def __init__(self):
-        self.logic = LogicLayer()
+        self.logic = LogicLayer(ResultCache())
         root = tk.Tk()
         root.title('Create full list')
         # Создание основного окна.
@@ -169,6 +362,10 @@ class Interfacing:
         self.resume_button = tk.Button(right_frame, text='Resume', command=self.resume_processing)
         self.resume_button.pack(side='top', fill='x', pady=15,)
 
+        self.job_controls = JobControls(right_frame)
+        self.job_controls.pack(side='top', fill='x')
+        # Строка состояния и кнопка отмены для обработки в фоновом потоке.
+
         self.save_button = tk.Button(right_frame, text='Save', command=self.logic.save_results_to_file)
         self.save_button.pack(side='bottom', fill='x')
         right_frame.pack(side='right', fill='y', pady=4, padx=2)
@@ -221,16 +418,21 @@ class Interfacing:
         self.group_entry.insert(0, file_path_text)
 
     def resume_processing(self): 
-        # Продолжает работу, заполняя текстовое поле результатом обработки значений проб.
-        # try:
-            text = self.logic.resume_processing()
-            self.list_of_sam_in_ob_box.delete(1.0, tk.END)
-            self.list_of_sam_in_ob_box.insert(1.0, text)
-            self.list_of_sam_in_ob_box.config(state=tk.DISABLED)
-            self.header_text['text'] = 'number      mean         line'
-        # except Exception:
-        #     error_text = 'Wrong file(s)'
-        #     self.open_error_window(error_text)
+        # Продолжает работу, заполняя текстовое поле результатом обработки значений проб. Обработка выполняется в
+        # фоновом потоке.
+        self.job_controls.start(self.logic.resume_processing, self.show_results, self.show_job_error)
+
+    def show_results(self, text):
+        self.list_of_sam_in_ob_box.delete(1.0, tk.END)
+        self.list_of_sam_in_ob_box.insert(1.0, text)
+        self.list_of_sam_in_ob_box.config(state=tk.DISABLED)
+        self.header_text['text'] = 'number      mean         line'
+        if not self.logic.tempsamples.report.is_empty():
+            self.open_error_window(str(self.logic.tempsamples.report))
+
+    def show_job_error(self, error):
+        error_text = 'Wrong file(s)\n' + str(error)
+        self.open_error_window(error_text)
 
     def open_error_window(self, error_text):
         error = tk.Tk()